@@ -1,23 +1,40 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
-import io, joblib, tensorflow as tf, soundfile as sf
+import joblib
+import tts as tts_engine
 from tts import synthesize
+from tts_cache import TtsCache
+from tts_stream import SpeechStreamer
+from tts_formats import AudioEncoder, FORMATS, negotiate
+from batching import MicroBatcher
+from inference import load_sentiment_model, pad_sequences
+from fast_tokenizer import FastTokenizer, load_tokenizer
+from registry import ModelRegistry
+from storage import open_storage
+from history_cache import HistoryCache
+from timing import StageTimer, StageMetrics
+from gpt_sentiment import gpt4_sentiment
+import signals
+from sentiment_cascade import SentimentCascade
+from sentiment_cache import SentimentCache
+from audio import prepare_for_stt
+from stt import transcribe_wav, StreamingSessions, SttWorkerPool, SttBusy
+from prefork import fork_context
 import logging
 import base64
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
 import os
-import wave
-from vosk import Model, KaldiRecognizer
+from vosk import Model
 import json
 import openai
 from dotenv import load_dotenv
 import traceback
 import time
 import random
-import re
 import requests
 from typing import Dict, List, Optional
 import geocoder
@@ -42,74 +59,127 @@ limiter = Limiter(
     storage_uri="memory://"
 )
 
-# Initialize Vosk model with absolute path
-model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model", "vosk-model-small-en-us-0.15")
-try:
-    model = Model(model_path)
-    logger.info(f"Successfully loaded Vosk model from {model_path}")
-except Exception as e:
-    logger.error(f"Failed to load Vosk model: {e}")
-    raise
-
-try:
-    tok = joblib.load("model/tokenizer.joblib")
-    enc = joblib.load("model/label_encoder.joblib")
-    model = tf.keras.models.load_model("model/sentiment.h5")
-except Exception as e:
-    logger.error(f"Failed to load models: {e}")
-    raise
-
-# User storage helpers
-USERS_FILE = "model/users.json"
-def load_users():
-    try:
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-def save_users(users):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f)
+# Model registry: every model lives under its own name and is loaded on
+# first use or by the background warmup below
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+model_path = os.path.join(MODEL_DIR, "vosk-model-small-en-us-0.15")
 
-CHAT_HISTORY_DIR = "model/chat_histories"
-os.makedirs(CHAT_HISTORY_DIR, exist_ok=True)
+# STT_WORKERS > 0 moves /stt decoding into a process pool (one Vosk model
+# per worker) and TTS_WORKERS > 0 renders speech in processes with a ready
+# engine each. Both fork, so every worker of both pools is forked here,
+# before any other thread and before either pool is submitted to. Where
+# fork is unavailable, or the TTS engines fail to start, both run in-process.
+STT_WORKERS = int(os.environ.get("STT_WORKERS", "0"))
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "0"))
+stt_pool = None
+if STT_WORKERS > 0 and fork_context() is None:
+    logger.warning("STT_WORKERS needs the fork start method; decoding in-process")
+elif STT_WORKERS > 0:
+    stt_pool = SttWorkerPool(
+        model_path,
+        workers=STT_WORKERS,
+        max_queue=int(os.environ.get("STT_MAX_QUEUE", str(2 * STT_WORKERS))),
+        timeout=float(os.environ.get("STT_TIMEOUT_SECONDS", "30")),
+    )
+if TTS_WORKERS > 0:
+    tts_engine.create_pool(TTS_WORKERS)
+    tts_engine.start_pool(TTS_WORKERS)
+if stt_pool is not None:
+    stt_pool.start()
 
-def get_history_path(username):
-    return os.path.join(CHAT_HISTORY_DIR, f"{username}.json")
+models = ModelRegistry()
+models.register("stt", lambda: Model(model_path))
+if stt_pool is not None:
+    models.register("stt_pool", stt_pool.wait_ready)
+# model/tokenizer.json (see fast_tokenizer.py) when exported, else the Keras pickle
+models.register("tokenizer", lambda: load_tokenizer(MODEL_DIR))
+models.register("label_encoder", lambda: joblib.load(os.path.join(MODEL_DIR, "label_encoder.joblib")))
+# SENTIMENT_RUNTIME=tflite loads the exported artefact without TensorFlow;
+# point SENTIMENT_TFLITE_PATH at model/sentiment.int8.tflite for the quantised one
+models.register("sentiment", lambda: load_sentiment_model(
+    os.environ.get("SENTIMENT_RUNTIME", "keras"),
+    keras_path=os.path.join(MODEL_DIR, "sentiment.h5"),
+    tflite_path=os.environ.get("SENTIMENT_TFLITE_PATH", os.path.join(MODEL_DIR, "sentiment.tflite")),
+))
 
-def load_chat_history(username):
-    try:
-        with open(get_history_path(username), "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
-
-def save_chat_history(username, history):
-    with open(get_history_path(username), "w") as f:
-        json.dump(history, f)
+# MODEL_WARMUP: "all" (default), "none", or a comma-separated list of names
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "all").strip()
+if MODEL_WARMUP != "none":
+    models.warmup(None if MODEL_WARMUP == "all" else [n.strip() for n in MODEL_WARMUP.split(",") if n.strip()])
 
+# User and history storage (see storage.py). STORAGE_BACKEND=sqlite keeps
+# everything in one WAL-mode database instead of the JSON files
+USERS_FILE = "model/users.json"
+CHAT_HISTORY_DIR = "model/chat_histories"
 MOOD_HISTORY_DIR = "model/mood_histories"
-os.makedirs(MOOD_HISTORY_DIR, exist_ok=True)
+store = open_storage(
+    os.environ.get("STORAGE_BACKEND", "json"),
+    users_file=USERS_FILE,
+    chat_dir=CHAT_HISTORY_DIR,
+    mood_dir=MOOD_HISTORY_DIR,
+    sqlite_path=os.environ.get("SQLITE_PATH", "model/pulsepath.db"),
+)
+# Opt-in write-back cache of active users' recent history (e.g.
+# HISTORY_CACHE_USERS=1000); appends are group-committed by a background
+# flusher. It is per process, so only enable it with one worker or sticky
+# sessions, and a crash can lose up to one flush interval of appends.
+history_cache = None
+HISTORY_CACHE_USERS = int(os.environ.get("HISTORY_CACHE_USERS", "0"))
+if HISTORY_CACHE_USERS > 0:
+    history_cache = store = HistoryCache(
+        store,
+        max_users=HISTORY_CACHE_USERS,
+        flush_interval_ms=int(os.environ.get("HISTORY_FLUSH_INTERVAL_MS", "250")),
+        max_pending=int(os.environ.get("HISTORY_CACHE_MAX_PENDING", "5000")),
+    )
+
+def load_chat_history(username):
+    return store.load_history("chat", username)
 
-def get_mood_path(username):
-    return os.path.join(MOOD_HISTORY_DIR, f"{username}.json")
+def load_recent_chat_history(username, n):
+    return store.recent_history("chat", username, n)
+
+def append_chat_history(username, entries):
+    store.append_history("chat", username, entries)
 
 def load_mood_history(username):
-    try:
-        with open(get_mood_path(username), "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
+    return store.load_history("mood", username)
+
+def append_mood_history(username, entries):
+    store.append_history("mood", username, entries)
 
-def save_mood_history(username, history):
-    with open(get_mood_path(username), "w") as f:
-        json.dump(history, f)
+def encode_texts(texts):
+    # One tokenizer call and one padded (N, 120) array for the whole batch
+    tok = models.get("tokenizer")
+    if isinstance(tok, FastTokenizer):
+        return tok.encode_batch(texts, maxlen=120)
+    return pad_sequences(tok.texts_to_sequences(texts), maxlen=120)
+
+def decode_probs(probs):
+    labels = models.get("label_encoder").inverse_transform(probs.argmax(axis=1))
+    return [(label, float(conf)) for label, conf in zip(labels, probs.max(axis=1))]
+
+def classify_batch(texts):
+    return decode_probs(models.get("sentiment").predict(encode_texts(texts)))
+
+SENTIMENT_BULK_CHUNK_SIZE = int(os.environ.get("SENTIMENT_BULK_CHUNK_SIZE", "256"))
+
+def classify_bulk(texts):
+    """Vectorised path for large offline batches; predicts in fixed-size chunks."""
+    probs = models.get("sentiment").predict(encode_texts(texts), batch_size=SENTIMENT_BULK_CHUNK_SIZE)
+    return decode_probs(probs)
+
+# Concurrent /sentiment calls share one forward pass of the Bi-LSTM
+sentiment_batcher = MicroBatcher(
+    classify_batch,
+    max_batch_size=int(os.environ.get("SENTIMENT_BATCH_MAX_SIZE", "32")),
+    max_wait_ms=float(os.environ.get("SENTIMENT_BATCH_WAIT_MS", "5")),
+    name="sentiment-batcher",
+)
+SENTIMENT_TIMEOUT = float(os.environ.get("SENTIMENT_TIMEOUT_SECONDS", "10"))
 
 def classify(text):
-    seq = tok.texts_to_sequences([text])
-    pad = tf.keras.preprocessing.sequence.pad_sequences(seq, maxlen=120)
-    probs = model(pad)[0].numpy()
-    return enc.inverse_transform([probs.argmax()])[0], float(probs.max())
+    return sentiment_batcher.submit(text, timeout=SENTIMENT_TIMEOUT)
 
 def validate_text(text: str) -> bool:
     return bool(text and len(text.strip()) > 0)
@@ -235,11 +305,6 @@ template_map = {
     "neutral": PROMPT_TEMPLATES[0],    # default
 }
 
-FRIENDLY_PATTERNS = [
-    r"\bhi\b|\bhello\b|\bhey\b|\bgood morning\b|\bgood afternoon\b|\bgood evening\b",
-    r"\bthank(s| you| u)?\b|\bappreciate\b|\bgrateful\b",
-    r"\bbye\b|\bgoodbye\b|\bsee you\b|\btake care\b|\blater\b|\bciao\b|\badios\b"
-]
 FRIENDLY_RESPONSES = [
     "You're very welcome! If you need anything else, I'm here for you.",
     "Hi there! How can I support you today?",
@@ -249,89 +314,12 @@ FRIENDLY_RESPONSES = [
     "Thank you for your kind words! Let me know if you need anything else."
 ]
 
-def is_friendly_message(text):
-    text = text.lower()
-    return any(re.search(pat, text) for pat in FRIENDLY_PATTERNS)
-
-SENTIMENT_KEYWORDS = {
-    "anxious": ["stressed", "anxious", "worried", "nervous", "overwhelmed", "panic", "afraid", "scared"],
-    "sad": ["sad", "down", "depressed", "unhappy", "hopeless", "cry"],
-    "angry": ["angry", "mad", "furious", "irritated", "annoyed", "frustrated", "resentful", "upset", "bothered"],
-    "happy": ["happy", "joyful", "excited", "glad", "content", "pleased"],
-    "overwhelmed": ["overwhelmed", "burned out", "too much", "can't handle", "exhausted", "swamped", "burdened", "drowning"],
-}
+# Friendly phrases and emotion keywords are matched in one scan (signals.py);
+# SIGNALS_PATH points at a JSON file of replacement tables, reloaded on change
+signals.configure(os.environ.get("SIGNALS_PATH") or None)
 
-SENTIMENT_PRIORITY = ["overwhelmed", "angry", "anxious", "sad", "happy"]
-
-def gpt4_sentiment(text):
-    prompt = (
-        "Classify the sentiment of the following message as one of: happy, sad, angry, anxious, excited, neutral, or overwhelmed. "
-        "Respond in the format: label (confidence%), e.g., happy (95%).\n"
-        "If the message contains clear emotional words, never return 'neutral'.\n"
-        "Always pick the strongest emotion if multiple are present.\n"
-        "Examples:\n"
-        "Message: I feel so down today.\nOutput: sad (90%)\n"
-        "Message: I'm really excited for my trip!\nOutput: excited (98%)\n"
-        "Message: I'm just okay.\nOutput: neutral (80%)\n"
-        "Message: I'm feeling very stressed about school.\nOutput: anxious (95%)\n"
-        "Message: Everything is too much, I can't handle it.\nOutput: overwhelmed (97%)\n"
-        "Message: I'm so angry at my friend.\nOutput: angry (92%)\n"
-        "Message: I'm feeling annoyed with the amount of work I have to do recently. It's been so overwhelming. How can I calm myself down.\nOutput: overwhelmed (95%)\n"
-        "Message: I'm frustrated and upset about my workload.\nOutput: angry (90%)\n"
-        f"Message: {text}\nOutput:"
-    )
-    try:
-        completion = openai.chat.completions.create(
-            model="gpt-4-1106-preview",
-            messages=[{"role": "system", "content": "You are a sentiment analysis assistant."}, {"role": "user", "content": prompt}],
-            functions=[
-                {
-                    "name": "classify_sentiment",
-                    "description": "Classify the sentiment of a message as one of: happy, sad, angry, anxious, excited, neutral, or overwhelmed. Return a confidence score (0-1).",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "label": {
-                                "type": "string",
-                                "enum": ["happy", "sad", "angry", "anxious", "excited", "neutral", "overwhelmed"],
-                                "description": "The sentiment label."
-                            },
-                            "confidence": {
-                                "type": "number",
-                                "minimum": 0,
-                                "maximum": 1,
-                                "description": "Confidence score between 0 and 1."
-                            }
-                        },
-                        "required": ["label", "confidence"]
-                    }
-                }
-            ],
-            function_call={"name": "classify_sentiment"},
-            max_tokens=50,
-            temperature=0
-        )
-        args = completion.choices[0].message.function_call.arguments
-        import json as _json
-        result = _json.loads(args)
-        label = result.get("label", "neutral")
-        conf = float(result.get("confidence", 0.8))
-        # Fallback heuristic: if label is neutral but text contains strong emotion words, pick strongest
-        if label == "neutral":
-            lowered = text.lower()
-            found = []
-            for k in SENTIMENT_PRIORITY:
-                for w in SENTIMENT_KEYWORDS[k]:
-                    if w in lowered:
-                        found.append(k)
-                        break
-            if found:
-                label = found[0]
-                conf = 0.9
-        return label, conf
-    except Exception as e:
-        logger.error(traceback.format_exc())
-        return "neutral", 0.8
+def is_friendly_message(text):
+    return signals.is_friendly(text)
 
 @app.post("/signup")
 def signup():
@@ -340,11 +328,9 @@ def signup():
     password = data.get("password")
     if not username or not password:
         return jsonify({"error": "Username and password required"}), 400
-    users = load_users()
-    if username in users:
+    # For real apps, hash the password!
+    if not store.add_user(username, password):
         return jsonify({"error": "Username already exists"}), 400
-    users[username] = password  # For real apps, hash the password!
-    save_users(users)
     return jsonify({"message": "Signup successful"}), 200
 
 @app.post("/login")
@@ -352,8 +338,8 @@ def login():
     try:
         username = request.json.get("username")
         password = request.json.get("password")
-        users = load_users()
-        if username in users and users[username] == password:
+        stored = store.get_user(username)
+        if stored is not None and stored == password:
             access_token = create_access_token(identity=username)
             return jsonify({"access_token": access_token}), 200
         return jsonify({"error": "Invalid credentials"}), 401
@@ -375,12 +361,98 @@ def sentiment():
         logger.error(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
+SENTIMENT_BULK_MAX_TEXTS = int(os.environ.get("SENTIMENT_BULK_MAX_TEXTS", "50000"))
+SENTIMENT_BULK_STREAM_THRESHOLD = int(os.environ.get("SENTIMENT_BULK_STREAM_THRESHOLD", "2000"))
+SENTIMENT_BULK_STREAM_BLOCK = int(os.environ.get("SENTIMENT_BULK_STREAM_BLOCK", "4096"))
+
+@app.post("/sentiment/batch")
+@jwt_required()
+@limiter.limit("10 per minute")
+def sentiment_batch():
+    try:
+        texts = (request.json or {}).get("texts")
+        if not isinstance(texts, list) or not texts:
+            return jsonify({"error": "texts must be a non-empty list"}), 400
+        if len(texts) > SENTIMENT_BULK_MAX_TEXTS:
+            return jsonify({"error": f"At most {SENTIMENT_BULK_MAX_TEXTS} texts per request"}), 413
+        if not all(isinstance(t, str) for t in texts):
+            return jsonify({"error": "Every text must be a string"}), 400
+        stream = (
+            request.args.get("stream") == "1"
+            or "application/x-ndjson" in request.headers.get("Accept", "")
+            or len(texts) > SENTIMENT_BULK_STREAM_THRESHOLD
+        )
+        if not stream:
+            results = classify_bulk(texts)
+            return jsonify({"results": [{"label": label, "confidence": conf} for label, conf in results]})
+
+        # NDJSON: classify one block at a time so only one block of
+        # padded sequences and probabilities is alive at once
+        def generate():
+            for start in range(0, len(texts), SENTIMENT_BULK_STREAM_BLOCK):
+                block = texts[start:start + SENTIMENT_BULK_STREAM_BLOCK]
+                for i, (label, conf) in enumerate(classify_bulk(block), start):
+                    yield json.dumps({"index": i, "label": label, "confidence": conf}) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    except Exception as e:
+        logger.error(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+# Rendered speech is cached on disk by hash of text + voice settings
+tts_cache = TtsCache(
+    os.path.join(MODEL_DIR, "tts_cache"),
+    voice_settings=f"pyttsx3;rate={tts_engine.RATE};volume={tts_engine.VOLUME};voice=female",
+    max_bytes=int(os.environ.get("TTS_CACHE_MAX_MB", "256")) * 1024 * 1024,
+)
+
 @app.post("/tts")
 @jwt_required()
 @limiter.limit("20 per minute")
 def tts():
-    wav = synthesize(request.json.get("text", ""))
-    return send_file(io.BytesIO(wav), mimetype="audio/wav")
+    # ?format= (or "format" in the body) wins over the Accept header
+    fmt = negotiate(request.args.get("format") or request.json.get("format"), request.accept_mimetypes)
+    if fmt is None:
+        return jsonify({"error": f"Unsupported format; use one of {', '.join(FORMATS)}"}), 400
+    text = request.json.get("text", "")
+    if fmt == "wav":
+        render = synthesize
+    else:
+        # Encoded variants are cached next to the WAV they were made from
+        render = lambda t: audio_encoder.encode(render_cached(t), fmt)
+    # send_file opens the file before returning, so eviction can't race it
+    response = tts_cache.use(
+        text, render, lambda path: send_file(path, mimetype=FORMATS[fmt][0], conditional=True), fmt)
+    response.vary.add("Accept")
+    return response
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def render_cached(text):
+    return tts_cache.use(text, synthesize, read_file)
+
+audio_encoder = AudioEncoder(workers=int(os.environ.get("TTS_ENCODE_THREADS", "2")))
+
+# Sentences render concurrently (in the TTS pool when enabled) and are
+# streamed in order; the first one is kept short enough for the budget
+speech_streamer = SpeechStreamer(
+    render_cached,
+    workers=max(2, TTS_WORKERS),
+    first_chunk_budget_ms=float(os.environ.get("TTS_STREAM_FIRST_CHUNK_MS", "800")),
+)
+
+@app.post("/tts/stream")
+@jwt_required()
+@limiter.limit("20 per minute")
+def tts_stream():
+    text = request.json.get("text", "")
+    if not text.strip():
+        return jsonify({"error": "No text provided"}), 400
+    return Response(stream_with_context(speech_streamer.stream(text)), mimetype="audio/wav")
+
+STT_PREPROCESS = os.environ.get("STT_PREPROCESS", "1") == "1"
+STT_VAD = os.environ.get("STT_VAD", "1") == "1"
 
 @app.post("/stt")
 @jwt_required()
@@ -389,61 +461,257 @@ def speech_to_text():
     try:
         if not request.json or 'audio' not in request.json:
             return jsonify({"error": "No audio data provided"}), 400
-            
-        # Decode base64 audio data
+
+        # Decode base64 audio data and transcribe it in memory
         audio_data = base64.b64decode(request.json['audio'])
-        
-        # Save audio data to a temporary WAV file
-        temp_file = "temp_input.wav"
-        with open(temp_file, 'wb') as f:
-            f.write(audio_data)
-        
-        # Open the WAV file
-        wf = wave.open(temp_file, "rb")
-        
-        # Create recognizer
-        rec = KaldiRecognizer(model, wf.getframerate())
-        rec.SetWords(True)
-        
-        # Process audio
-        transcript = ""
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            if rec.AcceptWaveform(data):
-                result = rec.Result()
-                transcript += result
-        
-        # Get final result
-        final_result = rec.FinalResult()
-        transcript += final_result
-        
-        # Clean up
-        wf.close()
-        os.remove(temp_file)
-        
+        if STT_PREPROCESS:
+            # 16 kHz mono + silence trimming before Kaldi sees the audio
+            audio_data, _ = prepare_for_stt(audio_data, vad=STT_VAD)
+        if stt_pool is not None:
+            transcript = stt_pool.transcribe(audio_data)
+        else:
+            transcript = transcribe_wav(models.get("stt"), audio_data)
         return jsonify({"text": transcript})
+    except SttBusy as e:
+        return jsonify({"error": str(e)}), 503
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         logger.error(f"Speech-to-text error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Streaming STT: open a session, POST raw 16-bit mono PCM chunks while
+# recording (partial results come back with each chunk), then finish
+stt_sessions = StreamingSessions(
+    idle_timeout=int(os.environ.get("STT_STREAM_IDLE_SECONDS", "60")),
+    max_sessions=int(os.environ.get("STT_STREAM_MAX_SESSIONS", "200")),
+)
+STT_STREAM_MAX_CHUNK_BYTES = 1024 * 1024
+
+@app.post("/stt/stream")
+@jwt_required()
+@limiter.limit("20 per minute")
+def stt_stream_open():
+    try:
+        body = request.get_json(silent=True) or {}
+        sample_rate = int(body.get("sample_rate", request.args.get("sample_rate", 16000)))
+        if not 8000 <= sample_rate <= 48000:
+            return jsonify({"error": "sample_rate must be between 8000 and 48000"}), 400
+        sid = stt_sessions.create(models.get("stt"), sample_rate, get_jwt_identity())
+        return jsonify({"session_id": sid, "sample_rate": sample_rate})
+    except OverflowError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Speech-to-text stream error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.post("/stt/stream/<sid>")
+@jwt_required()
+@limiter.limit("600 per minute")
+def stt_stream_chunk(sid):
+    try:
+        session = stt_sessions.get(sid, get_jwt_identity())
+    except KeyError:
+        return jsonify({"error": "Unknown or expired session"}), 404
+    pcm = request.get_data(cache=False)
+    if len(pcm) > STT_STREAM_MAX_CHUNK_BYTES:
+        return jsonify({"error": "Chunk too large"}), 413
+    if len(pcm) % 2:
+        return jsonify({"error": "PCM chunks must contain whole 16-bit samples"}), 400
+    try:
+        return jsonify(session.feed(pcm))
+    except Exception as e:
+        logger.error(f"Speech-to-text stream error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.post("/stt/stream/<sid>/finish")
+@jwt_required()
+@limiter.limit("20 per minute")
+def stt_stream_finish(sid):
+    try:
+        session = stt_sessions.pop(sid, get_jwt_identity())
+    except KeyError:
+        return jsonify({"error": "Unknown or expired session"}), 404
+    try:
+        return jsonify(session.finish())
+    except Exception as e:
+        logger.error(f"Speech-to-text stream error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+HISTORY_PAGE_PARAMS = ("limit", "before", "after", "since", "until")
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 500
+
+def history_page_args():
+    """Parse pagination query args; None when the caller wants the full history."""
+    if not any(p in request.args for p in HISTORY_PAGE_PARAMS):
+        return None
+    args = {}
+    for p in HISTORY_PAGE_PARAMS:
+        value = request.args.get(p)
+        if value is not None:
+            try:
+                args[p] = int(value)
+            except ValueError:
+                raise ValueError(f"{p} must be an integer")
+    args["limit"] = max(1, min(args.get("limit", HISTORY_DEFAULT_LIMIT), HISTORY_MAX_LIMIT))
+    return args
+
+def history_page(kind, username, args):
+    entries, has_more = store.page_history(kind, username, **args)
+    return entries, {
+        "has_more": has_more,
+        "next_before": entries[0]["id"] if entries else None,
+        "next_after": entries[-1]["id"] if entries else None,
+    }
+
 @app.get("/chat-history")
 @jwt_required()
 def chat_history():
     username = get_jwt_identity()
-    history = load_chat_history(username)
-    return jsonify({"history": history})
+    try:
+        args = history_page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if args is None:
+        return jsonify({"history": load_chat_history(username)})
+    history, cursor = history_page("chat", username, args)
+    return jsonify({"history": history, **cursor})
 
 @app.get("/mood-history")
 @jwt_required()
 def mood_history():
     username = get_jwt_identity()
-    history = load_mood_history(username)
+    try:
+        args = history_page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if args is None:
+        history, cursor = load_mood_history(username), {}
+    else:
+        history, cursor = history_page("mood", username, args)
     # Add emoji to each mood
     for m in history:
         m["emoji"] = MOOD_EMOJIS.get(m["sentiment"], "❓")
-    return jsonify({"mood": history})
+    return jsonify({"mood": history, **cursor})
+
+@app.get("/mood-summary")
+@jwt_required()
+def mood_summary():
+    """Per-day or per-week sentiment counts and mean confidence, maintained
+    incrementally as mood entries are appended."""
+    username = get_jwt_identity()
+    period = request.args.get("period", "day")
+    if period not in ("day", "week"):
+        return jsonify({"error": "period must be 'day' or 'week'"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 30)), 366))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    buckets = store.mood_summary(username, period, limit)
+    for b in buckets:
+        top = max(b["sentiments"], key=b["sentiments"].get, default="neutral")
+        b["dominant"] = top
+        b["emoji"] = MOOD_EMOJIS.get(top, "❓")
+    return jsonify({"period": period, "buckets": buckets})
+
+# GPT-4 sentiment results, keyed on normalized text. SENTIMENT_CACHE_PATH
+# shares them between worker processes through a SQLite file.
+sentiment_cache = None
+if int(os.environ.get("SENTIMENT_CACHE_SIZE", "10000")) > 0:
+    sentiment_cache = SentimentCache(
+        max_entries=int(os.environ.get("SENTIMENT_CACHE_SIZE", "10000")),
+        ttl=float(os.environ.get("SENTIMENT_CACHE_TTL_SECONDS", str(24 * 3600))),
+        shared_path=os.environ.get("SENTIMENT_CACHE_PATH") or None,
+        shared_max_entries=int(os.environ.get("SENTIMENT_CACHE_SHARED_MAX", "100000")),
+    )
+
+def cached_gpt4_sentiment(text):
+    return gpt4_sentiment(text, cache=sentiment_cache)
+
+# /conversation sentiment: unambiguous, un-negated keywords, then the local
+# model, and GPT-4 only when the local model is less than
+# SENTIMENT_CASCADE_THRESHOLD confident. SENTIMENT_CASCADE=0 sends every
+# message to GPT-4; SENTIMENT_CASCADE_KEYWORDS=0 skips the keyword tier.
+SENTIMENT_CASCADE = os.environ.get("SENTIMENT_CASCADE", "1") == "1"
+sentiment_cascade = SentimentCascade(
+    signals.confident_sentiment if os.environ.get("SENTIMENT_CASCADE_KEYWORDS", "1") == "1" else None,
+    classify, cached_gpt4_sentiment,
+    threshold=float(os.environ.get("SENTIMENT_CASCADE_THRESHOLD", "0.85")),
+)
+
+def conversation_sentiment(text):
+    """(label, confidence, tier) for a /conversation message."""
+    if SENTIMENT_CASCADE:
+        return sentiment_cascade.classify(text)
+    label, conf = cached_gpt4_sentiment(text)
+    return label, conf, "gpt"
+
+# Threads for the concurrent stages of /conversation (mostly waiting on OpenAI)
+conversation_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("CONVERSATION_THREADS", "16")), thread_name_prefix="conversation")
+# Speculating is only worth it when the keywords aren't already a sentiment
+# tier: with the cascade's keyword tier on, a confident keyword label *is*
+# the final label (answered in microseconds) and anything less confident
+# would mostly miss, paying for two GPT-4 replies.
+CONVERSATION_SPECULATE = (os.environ.get("CONVERSATION_SPECULATE", "1") == "1"
+                          and not (SENTIMENT_CASCADE and sentiment_cascade.keywords is not None))
+conversation_metrics = StageMetrics()
+conversation_stream_metrics = StageMetrics()
+
+def build_reply_messages(text, label, history):
+    """Chat messages for the GPT-4 reply, plus the last AI message (or None)."""
+    chat_context = "\n".join([
+        f"User: {msg['text']}" if msg['sender'] == 'user' else f"AI: {msg['text']}" for msg in history[-10:]
+    ])
+    last_ai = next((msg['text'] for msg in reversed(history) if msg['sender'] == 'ai'), None)
+    # Choose system prompt based on sentiment
+    system_prompt = template_map.get(label, random.choice(PROMPT_TEMPLATES)).format(sentiment=label)
+    user_prompt = f"User: {text}\nSentiment: {label}"
+    messages = [
+        {"role": "system", "content": system_prompt},
+    ]
+    if chat_context:
+        messages.append({"role": "user", "content": chat_context})
+    if last_ai:
+        messages.append({"role": "assistant", "content": last_ai})
+    messages.append({"role": "user", "content": user_prompt})
+    return messages, last_ai
+
+def repeats_last(ai_response, last_ai):
+    return bool(last_ai) and ai_response.lower().strip() == last_ai.lower().strip()
+
+def generate_reply(text, label, history):
+    """GPT-4 therapeutic reply for `text` given its sentiment and recent history."""
+    messages, last_ai = build_reply_messages(text, label, history)
+    try:
+        completion = openai.chat.completions.create(
+            model="gpt-4",
+            messages=messages,
+            max_tokens=300,
+            temperature=0.85
+        )
+        ai_response = completion.choices[0].message.content.strip()
+        # If the AI response is too similar to the last, append a random fallback
+        if repeats_last(ai_response, last_ai):
+            ai_response += "\n" + random.choice(FALLBACKS)
+    except Exception as e:
+        logger.error(traceback.format_exc())
+        ai_response = random.choice(FALLBACKS)
+    return ai_response
+
+def save_turn(username, text, label, conf, ai_response, mood_ts=None):
+    now = int(time.time())
+    append_mood_history(username, [{
+        "timestamp": mood_ts or now,
+        "sentiment": label,
+        "confidence": conf,
+        "text": text
+    }])
+    append_chat_history(username, [
+        {"sender": "user", "text": text, "timestamp": now},
+        {"sender": "ai", "text": ai_response, "label": label, "confidence": conf, "timestamp": now},
+    ])
 
 @app.post("/conversation")
 @jwt_required()
@@ -457,95 +725,168 @@ def conversation():
         # Friendly check
         if is_friendly_message(text):
             ai_response = random.choice(FRIENDLY_RESPONSES)
-            label, conf = gpt4_sentiment(text)
-            # Mood tracking
-            mood_hist = load_mood_history(username)
-            mood_hist.append({
-                "timestamp": int(time.time()),
-                "sentiment": label,
-                "confidence": conf,
-                "text": text
-            })
-            save_mood_history(username, mood_hist)
-            # Save to chat history
-            history = load_chat_history(username)
-            history.append({"sender": "user", "text": text})
-            history.append({"sender": "ai", "text": ai_response, "label": label, "confidence": conf})
-            save_chat_history(username, history)
+            label, conf, _ = conversation_sentiment(text)
+            # Mood tracking + chat history
+            save_turn(username, text, label, conf, ai_response)
             return jsonify({
                 "label": label,
                 "confidence": conf,
                 "ai_response": ai_response
             })
-        # Use GPT-4 for sentiment (therapeutic)
-        label, conf = gpt4_sentiment(text)
-        # Mood tracking
-        mood_hist = load_mood_history(username)
-        mood_hist.append({
-            "timestamp": int(time.time()),
-            "sentiment": label,
-            "confidence": conf,
-            "text": text
-        })
-        save_mood_history(username, mood_hist)
-        # Use GPT-4 for advanced response
-        history = load_chat_history(username)
-        chat_context = "\n".join([
-            f"User: {msg['text']}" if msg['sender'] == 'user' else f"AI: {msg['text']}" for msg in history[-10:]
-        ])
-        last_ai = next((msg['text'] for msg in reversed(history) if msg['sender'] == 'ai'), None)
-        # Choose system prompt based on sentiment
-        system_prompt = template_map.get(label, random.choice(PROMPT_TEMPLATES)).format(sentiment=label)
-        user_prompt = f"User: {text}\nSentiment: {label}"
-        messages = [
-            {"role": "system", "content": system_prompt},
-        ]
-        if chat_context:
-            messages.append({"role": "user", "content": chat_context})
-        if last_ai:
-            messages.append({"role": "assistant", "content": last_ai})
-        messages.append({"role": "user", "content": user_prompt})
-        try:
-            completion = openai.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                max_tokens=300,
-                temperature=0.85
-            )
-            ai_response = completion.choices[0].message.content.strip()
-            # If the AI response is too similar to the last, append a random fallback
-            if last_ai and ai_response.lower().strip() == last_ai.lower().strip():
-                ai_response += "\n" + random.choice(FALLBACKS)
-        except Exception as e:
-            logger.error(traceback.format_exc())
-            ai_response = random.choice(FALLBACKS)
-        # Save to chat history
-        history.append({"sender": "user", "text": text})
-        history.append({"sender": "ai", "text": ai_response, "label": label, "confidence": conf})
-        save_chat_history(username, history)
-        return jsonify({
+        # Sentiment and the history read run concurrently. When the keywords
+        # name a sentiment unambiguously (the cascade's keyword-tier gate),
+        # the reply starts on that label straight away and is kept if the
+        # final label agrees.
+        timer = StageTimer()
+        sentiment_f = conversation_executor.submit(timer.timed, "sentiment", conversation_sentiment, text)
+        history_f = conversation_executor.submit(timer.timed, "history", load_recent_chat_history, username, 10)
+        provisional = signals.confident_sentiment(text) if CONVERSATION_SPECULATE else None
+        reply_f = None
+        if provisional:
+            reply_f = conversation_executor.submit(timer.timed, "reply_speculative", generate_reply, text, provisional, history_f.result())
+        label, conf, tier = sentiment_f.result()
+        timer.note("sentiment_tier", tier)
+        mood_ts = int(time.time())
+        if reply_f is not None and label == provisional:
+            ai_response = reply_f.result()
+            timer.note("speculation", "hit")
+        else:
+            if reply_f is not None:
+                reply_f.cancel()  # already running; its result is discarded
+                timer.note("speculation", "miss")
+            ai_response = timer.timed("reply", generate_reply, text, label, history_f.result())
+        conversation_metrics.record(timer)
+        # Mood tracking + chat history
+        save_turn(username, text, label, conf, ai_response, mood_ts=mood_ts)
+        response = jsonify({
             "label": label,
             "confidence": conf,
             "ai_response": ai_response
         })
+        response.headers["Server-Timing"] = timer.header()
+        return response
     except Exception as e:
         logger.error(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/conversation/stream")
+@jwt_required()
+@limiter.limit("20 per minute")
+def conversation_stream():
+    """/conversation as Server-Sent Events: a `sentiment` event, then `token`
+    events as GPT-4 produces the reply, then `done` with the full turn. The
+    turn is saved once the reply is complete."""
+    username = get_jwt_identity()
+    text = request.json.get("text", "")
+    if not text:
+        return jsonify({"error": "No text provided"}), 400
+
+    def generate():
+        timer = StageTimer()
+        if is_friendly_message(text):
+            label, conf, _ = conversation_sentiment(text)
+            yield sse("sentiment", {"label": label, "confidence": conf})
+            ai_response = random.choice(FRIENDLY_RESPONSES)
+            yield sse("token", {"text": ai_response})
+            save_turn(username, text, label, conf, ai_response)
+            yield sse("done", {"label": label, "confidence": conf, "ai_response": ai_response})
+            return
+
+        sentiment_f = conversation_executor.submit(timer.timed, "sentiment", conversation_sentiment, text)
+        history_f = conversation_executor.submit(timer.timed, "history", load_recent_chat_history, username, 10)
+        label, conf, tier = sentiment_f.result()
+        mood_ts = int(time.time())
+        timer.note("sentiment_tier", tier)
+        yield sse("sentiment", {"label": label, "confidence": conf})
+
+        messages, last_ai = build_reply_messages(text, label, history_f.result())
+        parts = []
+        stream = None
+        try:
+            with timer.stage("reply"):
+                stream = openai.chat.completions.create(
+                    model="gpt-4",
+                    messages=messages,
+                    max_tokens=300,
+                    temperature=0.85,
+                    stream=True,
+                )
+                for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if not parts:
+                        timer.mark("first_token")
+                    parts.append(delta)
+                    yield sse("token", {"text": delta})
+            ai_response = "".join(parts).strip()
+            if repeats_last(ai_response, last_ai):
+                extra = "\n" + random.choice(FALLBACKS)
+                ai_response += extra
+                yield sse("token", {"text": extra})
+        except GeneratorExit:
+            # Client went away mid-reply: stop generating, save nothing
+            if stream is not None:
+                stream.close()
+            raise
+        except Exception:
+            logger.error(traceback.format_exc())
+            ai_response = "".join(parts).strip()
+            if not ai_response:
+                ai_response = random.choice(FALLBACKS)
+                yield sse("token", {"text": ai_response})
+        conversation_stream_metrics.record(timer)
+        save_turn(username, text, label, conf, ai_response, mood_ts=mood_ts)
+        yield sse("done", {"label": label, "confidence": conf, "ai_response": ai_response})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/delete-history")
 @jwt_required()
 def delete_history():
     username = get_jwt_identity()
     try:
-        save_chat_history(username, [])
-        save_mood_history(username, [])  # Also clear mood history
+        store.clear_history("chat", username)
+        store.clear_history("mood", username)  # Also clear mood history
         return jsonify({"message": "Chat history deleted."})
     except Exception as e:
         logger.error(f"Delete history error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @app.get("/healthz")
-def healthz(): return "ok", 200
+def healthz():
+    # /healthz?models=stt,sentiment (or models=all) reports per-model readiness
+    # and returns 503 until every requested model is loaded
+    requested = request.args.get("models")
+    if not requested:
+        return "ok", 200
+    names = None if requested == "all" else [n.strip() for n in requested.split(",") if n.strip()]
+    try:
+        status = models.status(names)
+    except KeyError as e:
+        return jsonify({"error": f"Unknown model: {e.args[0]}"}), 404
+    ready = all(s["ready"] for s in status.values())
+    return jsonify({"ready": ready, "models": status}), 200 if ready else 503
+
+@app.get("/metrics")
+def metrics():
+    return jsonify({
+        "sentiment_batching": sentiment_batcher.stats(),
+        "models": models.status(),
+        "history_cache": history_cache.stats() if history_cache else None,
+        "stt_pool": stt_pool.stats() if stt_pool else None,
+        "tts_cache": tts_cache.stats(),
+        "tts_stream": speech_streamer.stats(),
+        "tts_encoding": audio_encoder.stats(),
+        "conversation": conversation_metrics.stats(),
+        "conversation_stream": conversation_stream_metrics.stats(),
+        "sentiment_cascade": sentiment_cascade.stats(),
+        "sentiment_cache": sentiment_cache.stats() if sentiment_cache else None,
+    })
 
 FALLBACKS = [
     # --- quick grounding ideas
@@ -1026,5 +1367,9 @@ def get_healthcare_resources():
         logger.error(f"Error getting healthcare resources: {e}")
         return jsonify({"error": "Failed to get healthcare resources"}), 500
 
+# Canned replies are read out often; render them once up front
+if os.environ.get("TTS_PRERENDER", "1") == "1":
+    tts_cache.prerender(FALLBACKS + FRIENDLY_RESPONSES, synthesize)
+
 if __name__ == "__main__":
     app.run(port=5000)
@@ -0,0 +1,112 @@
+# ai/audio.py
+"""Audio front-end for speech-to-text.
+
+`prepare_for_stt` turns whatever the browser recorded into what the Vosk
+model expects: 16 kHz mono 16-bit PCM, with leading/trailing silence cut
+and long pauses shortened by an energy-based voice activity detector, so
+the recognizer only spends CPU on speech.
+"""
+import io
+import wave
+from math import gcd
+
+import numpy as np
+
+STT_SAMPLE_RATE = 16000
+
+
+def read_wav(wav_bytes):
+    """Decode a PCM WAV into mono float32 samples in [-1, 1] and its rate."""
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+        channels, width, rate = wf.getnchannels(), wf.getsampwidth(), wf.getframerate()
+        raw = wf.readframes(wf.getnframes())
+    if width == 1:
+        x = (np.frombuffer(raw, np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        x = np.frombuffer(raw, "<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, np.uint8).reshape(-1, 3).astype(np.int32)
+        v = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        x = (np.where(v >= 1 << 23, v - (1 << 24), v)).astype(np.float32) / float(1 << 23)
+    elif width == 4:
+        x = np.frombuffer(raw, "<i4").astype(np.float32) / float(1 << 31)
+    else:
+        raise ValueError(f"Unsupported sample width: {width} bytes")
+    if channels > 1:
+        x = x[: len(x) - len(x) % channels].reshape(-1, channels).mean(axis=1)
+    return x, rate
+
+
+def resample(x, src_rate, dst_rate):
+    if src_rate == dst_rate or len(x) == 0:
+        return x
+    try:
+        from scipy.signal import resample_poly
+        g = gcd(src_rate, dst_rate)
+        return resample_poly(x, dst_rate // g, src_rate // g).astype(np.float32)
+    except ImportError:
+        # Linear interpolation; fine for speech when SciPy isn't installed
+        n = int(round(len(x) * dst_rate / src_rate))
+        return np.interp(np.arange(n) * (src_rate / dst_rate), np.arange(len(x)), x).astype(np.float32)
+
+
+def trim_silence(x, rate, frame_ms=30, margin_db=10.0, floor_db=-50.0, pad_ms=200, max_gap_ms=400):
+    """Energy VAD: drop leading/trailing silence and shorten long pauses.
+
+    A frame is speech when its level is `margin_db` above the clip's noise
+    floor (10th percentile of frame levels) and above `floor_db`. Speech is
+    padded by `pad_ms` on both sides, and internal pauses longer than
+    `max_gap_ms` are cut down to that length. Returns the input unchanged
+    if no speech is found.
+    """
+    frame = max(1, int(rate * frame_ms / 1000))
+    n = len(x) // frame
+    if n == 0:
+        return x
+    frames = x[: n * frame].reshape(n, frame)
+    db = 10.0 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    threshold = max(np.percentile(db, 10) + margin_db, floor_db)
+    speech = db > threshold
+    if not speech.any():
+        return x
+
+    pad = int(np.ceil(pad_ms / frame_ms))
+    if pad:
+        speech = np.convolve(speech, np.ones(2 * pad + 1), mode="same") > 0
+
+    keep = speech.copy()
+    max_gap = max(1, int(max_gap_ms / frame_ms))
+    edges = np.flatnonzero(np.diff(speech.astype(np.int8))) + 1
+    bounds = np.concatenate(([0], edges, [n]))
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        if not speech[a] and a > 0 and b < n:
+            if b - a > max_gap:
+                keep[a:a + max_gap // 2] = True
+                keep[b - (max_gap - max_gap // 2):b] = True
+            else:
+                keep[a:b] = True
+    return frames[keep].reshape(-1)
+
+
+def to_wav(x, rate):
+    pcm = (np.clip(x, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm)
+    return buf.getvalue()
+
+
+def prepare_for_stt(wav_bytes, vad=True, rate=STT_SAMPLE_RATE):
+    """Downmix, resample to `rate` and (optionally) trim silence.
+
+    Returns the new WAV bytes and a small report of input/output seconds.
+    """
+    x, src_rate = read_wav(wav_bytes)
+    input_seconds = len(x) / float(src_rate)
+    x = resample(x, src_rate, rate)
+    if vad:
+        x = trim_silence(x, rate)
+    return to_wav(x, rate), {"input_seconds": input_seconds, "output_seconds": len(x) / float(rate)}
@@ -0,0 +1,90 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collects concurrent single-item calls into one batched call.
+
+    `predict_batch` receives a list of inputs and must return a list of
+    results in the same order. Callers block in `submit` until their own
+    result is ready. A batch is dispatched once `max_batch_size` items are
+    waiting or `max_wait_ms` has passed since the first item arrived.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=32, max_wait_ms=5, name="batcher"):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._batches = 0
+        self._busy_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item, timeout=None):
+        future = Future()
+        self._queue.put((item, future))
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = self.predict_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"{self.name}: got {len(results)} results for {len(items)} inputs"
+                    )
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(items)} failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self._batch_sizes[len(items)] += 1
+                    self._requests += len(items)
+                    self._batches += 1
+                    self._busy_seconds += elapsed
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "requests": self._requests,
+                "batches": self._batches,
+                "mean_batch_size": self._requests / self._batches if self._batches else 0.0,
+                "max_batch_size_reached": max(self._batch_sizes, default=0),
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "busy_seconds": round(self._busy_seconds, 4),
+                "queue_depth": self._queue.qsize(),
+            }
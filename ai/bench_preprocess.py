@@ -0,0 +1,47 @@
+# ai/bench_preprocess.py
+"""Cleaning throughput: clean() row by row vs clean_batch().
+
+    python bench_preprocess.py [--csv combined.csv] [--rows 500000] [--workers 1,4]
+
+Without --csv the bundled test tweets are repeated up to --rows.
+Throughput is reported in rows/s and rows/s per worker process.
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from preprocess import clean, clean_batch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_texts(csv, rows):
+    if csv:
+        return pd.read_csv(csv, nrows=rows)["text"].astype(str).tolist()
+    tweets = pd.read_csv(os.path.join(HERE, "testdata.manual.2009.06.14.csv"),
+                         header=None, encoding="latin-1")[5].astype(str).tolist()
+    return (tweets * (rows // len(tweets) + 1))[:rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv")
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--workers", default=f"1,{os.cpu_count()}")
+    args = parser.parse_args()
+
+    texts = load_texts(args.csv, args.rows)
+    series = pd.Series(texts)
+    start = time.perf_counter()
+    reference = series.apply(clean).tolist()
+    base = len(texts) / (time.perf_counter() - start)
+    print(f"apply(clean)          {base:10.0f} rows/s  {base:10.0f} rows/s/core")
+    for workers in sorted({int(w) for w in args.workers.split(",")}):
+        start = time.perf_counter()
+        out = clean_batch(texts, workers=workers)
+        rate = len(texts) / (time.perf_counter() - start)
+        assert out == reference, "clean_batch output differs from clean"
+        print(f"clean_batch workers={workers:<2} {rate:10.0f} rows/s  {rate / workers:10.0f} rows/s/core"
+              f"  ({rate / base:.1f}x)")
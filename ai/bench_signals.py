@@ -0,0 +1,90 @@
+# ai/bench_signals.py
+"""Per-message cost of friendly/keyword detection: the old regex + nested
+substring loops against the single-scan matcher in signals.py.
+
+    python bench_signals.py [--messages 20000]
+"""
+import argparse
+import random
+import re
+import time
+
+from signals import DEFAULT_TABLES, SignalMatcher
+
+# The checks /conversation used to run on every message
+OLD_FRIENDLY_PATTERNS = [
+    r"\bhi\b|\bhello\b|\bhey\b|\bgood morning\b|\bgood afternoon\b|\bgood evening\b",
+    r"\bthank(s| you| u)?\b|\bappreciate\b|\bgrateful\b",
+    r"\bbye\b|\bgoodbye\b|\bsee you\b|\btake care\b|\blater\b|\bciao\b|\badios\b"
+]
+OLD_KEYWORDS = {
+    "anxious": ["stressed", "anxious", "worried", "nervous", "overwhelmed", "panic", "afraid", "scared"],
+    "sad": ["sad", "down", "depressed", "unhappy", "hopeless", "cry"],
+    "angry": ["angry", "mad", "furious", "irritated", "annoyed", "frustrated", "resentful", "upset", "bothered"],
+    "happy": ["happy", "joyful", "excited", "glad", "content", "pleased"],
+    "overwhelmed": ["overwhelmed", "burned out", "too much", "can't handle", "exhausted", "swamped", "burdened", "drowning"],
+}
+OLD_PRIORITY = ["overwhelmed", "angry", "anxious", "sad", "happy"]
+
+
+def old_scan(text):
+    lowered = text.lower()
+    friendly = any(re.search(pat, lowered) for pat in OLD_FRIENDLY_PATTERNS)
+    found = None
+    for k in OLD_PRIORITY:
+        for w in OLD_KEYWORDS[k]:
+            if w in lowered:
+                found = k
+                break
+        if found:
+            break
+    return friendly, found
+
+
+def new_scan(matcher, text):
+    signals = matcher.scan(text)
+    return signals.friendly, signals.sentiments[0] if signals.sentiments else None
+
+
+WORDS = ("i feel really so today work school my friend the and about it was have been "
+         "tired okay lately sleep again always never").split()
+SIGNAL_WORDS = ["hi", "thanks", "later", "sad", "mad", "too much", "burned out", "overwhelmed", "happy"]
+# substrings of keywords inside other words, which only the old scan matched
+TRAP_WORDS = ["made", "translated", "download", "crystal", "contentious"]
+
+
+def messages(n, seed=0):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(4, 40))]
+        if rng.random() < 0.5:
+            words.insert(rng.randrange(len(words)), rng.choice(SIGNAL_WORDS))
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words)), rng.choice(TRAP_WORDS))
+        out.append(" ".join(words).capitalize() + ".")
+    return out
+
+
+def bench(fn, texts):
+    start = time.perf_counter()
+    for t in texts:
+        fn(t)
+    return (time.perf_counter() - start) / len(texts) * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    texts = messages(args.messages)
+    start = time.perf_counter()
+    matcher = SignalMatcher(DEFAULT_TABLES)
+    print(f"build matcher   {(time.perf_counter() - start) * 1000:8.2f} ms")
+    old_us = bench(old_scan, texts)
+    new_us = bench(lambda t: new_scan(matcher, t), texts)
+    print(f"old regex+loops {old_us:8.2f} us/message")
+    print(f"single scan     {new_us:8.2f} us/message  ({old_us / new_us:.2f}x)")
+    differ = sum(old_scan(t) != new_scan(matcher, t) for t in texts)
+    print(f"results differ on {differ / len(texts):.1%} of messages (the planted substrings: 'made' is not 'mad')")
@@ -0,0 +1,68 @@
+# ai/bench_stt.py
+"""Real-time factor of Vosk decoding with and without the audio front-end.
+
+    python bench_stt.py clip1.wav [clip2.wav ...]
+
+RTF = decode seconds / seconds of original audio (lower is better). The
+"prepared" run includes the cost of resampling and VAD.
+"""
+import json
+import os
+import sys
+import time
+
+from vosk import Model, SetLogLevel
+
+from audio import prepare_for_stt, read_wav
+from stt import transcribe_wav
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model", "vosk-model-small-en-us-0.15")
+
+
+def words(transcript):
+    # transcribe_wav returns concatenated Vosk JSON objects
+    decoder, pos, out = json.JSONDecoder(), 0, []
+    while pos < len(transcript):
+        obj, pos = decoder.raw_decode(transcript, pos)
+        out.append(obj.get("text", ""))
+    return " ".join(t for t in out if t)
+
+
+def main(paths):
+    SetLogLevel(-1)
+    model = Model(MODEL_PATH)
+    total = {"audio": 0.0, "raw": 0.0, "prepared": 0.0, "kept": 0.0}
+    for path in paths:
+        with open(path, "rb") as f:
+            wav = f.read()
+        x, rate = read_wav(wav)
+        seconds = len(x) / float(rate)
+
+        start = time.perf_counter()
+        raw_text = words(transcribe_wav(model, wav))
+        raw = time.perf_counter() - start
+
+        start = time.perf_counter()
+        prepared_wav, report = prepare_for_stt(wav)
+        prepared_text = words(transcribe_wav(model, prepared_wav))
+        prepared = time.perf_counter() - start
+
+        total["audio"] += seconds
+        total["raw"] += raw
+        total["prepared"] += prepared
+        total["kept"] += report["output_seconds"]
+        print(f"{path}: {seconds:.1f}s @ {rate} Hz, kept {report['output_seconds']:.1f}s | "
+              f"RTF raw {raw / seconds:.3f} -> prepared {prepared / seconds:.3f}"
+              f"{'' if raw_text == prepared_text else ' | transcript changed'}")
+        if raw_text != prepared_text:
+            print(f"  raw:      {raw_text}\n  prepared: {prepared_text}")
+
+    if total["audio"]:
+        print(f"TOTAL {total['audio']:.1f}s audio ({total['kept'] / total['audio']:.0%} kept) | "
+              f"RTF raw {total['raw'] / total['audio']:.3f} -> prepared {total['prepared'] / total['audio']:.3f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python bench_stt.py clip.wav [clip.wav ...]")
+    main(sys.argv[1:])
@@ -0,0 +1,51 @@
+# ai/bench_tts.py
+"""Throughput of N concurrent synthesize() calls.
+
+    python bench_tts.py [--workers 0,2,4] [--concurrency 8] [--calls 32]
+
+--workers 0 measures the in-process engine (calls are serialised).
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tts
+
+TEXT = "Try box-breathing: inhale four seconds, hold four seconds, exhale four seconds, hold four seconds."
+
+
+def run(concurrency, calls):
+    latencies = []
+
+    def one(_):
+        start = time.perf_counter()
+        tts.synthesize(TEXT)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, range(calls)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return calls / elapsed, statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="0,2,4")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=32)
+    args = parser.parse_args()
+
+    for workers in (int(w) for w in args.workers.split(",")):
+        if workers:
+            tts.create_pool(workers)
+            pool = tts.start_pool(workers)
+        tts.synthesize(TEXT)  # warm up
+        rate, p50, p95 = run(args.concurrency, args.calls)
+        print(f"workers={workers:<2} concurrency={args.concurrency:<3} "
+              f"{rate:6.2f} calls/s  p50 {p50 * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms")
+        if workers and pool is not None:
+            pool.shutdown()
+            tts._pool = None
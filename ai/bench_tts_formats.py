@@ -0,0 +1,40 @@
+# ai/bench_tts_formats.py
+"""Size and encode latency of each /tts output format for typical replies.
+
+    python bench_tts_formats.py [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+
+import tts
+from tts_formats import FORMATS, encode
+
+REPLIES = {
+    "short": "I'm here with you. Take a slow breath.",
+    "medium": "Try box-breathing: inhale four seconds, hold four seconds, exhale four seconds, "
+              "hold four seconds. Repeat it a few times and notice how your body feels.",
+    "long": "Here's a grounding trick: look around and name 5 things you can see, 4 you can touch, "
+            "3 you can hear, 2 you can smell, and 1 you can taste. It helps bring you back to the "
+            "present. If your thoughts keep racing, that's okay; gently return to the next thing on "
+            "the list, and take as long as you need.",
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, text in REPLIES.items():
+        wav = tts.synthesize(text)
+        print(f"{name} ({len(text)} chars)")
+        for fmt in FORMATS:
+            encode(wav, fmt)  # warm up
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                data = encode(wav, fmt)
+                times.append(time.perf_counter() - start)
+            print(f"  {fmt:<5} {len(data) / 1024:8.1f} KiB  {len(wav) / len(data):5.1f}x  "
+                  f"encode {statistics.median(times) * 1000:7.1f} ms")
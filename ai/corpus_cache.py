@@ -0,0 +1,87 @@
+# ai/corpus_cache.py
+"""On-disk cache of the encoded training corpus.
+
+Each entry is a directory of `.npy` arrays (written with `open_memmap`, read
+back with `mmap_mode="r"`, so nothing is copied into memory) plus whatever
+else the trainer stores next to them. Entries are keyed by a hash of the
+input CSV and the settings that shape the arrays, so editing the data, the
+cleaning or the tokenizer settings makes a new entry; old entries are
+removed oldest-first once the cache is over `max_bytes`.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusCache:
+    def __init__(self, directory, max_bytes=20 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(csv_path, settings, block_size=1 << 20):
+        digest = hashlib.sha256()
+        with open(csv_path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()[:32]
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def lookup(self, key):
+        """The entry's directory if it is complete, else None."""
+        path = self.path(key)
+        if not os.path.isdir(path):
+            return None
+        os.utime(path)  # most recently used survives cleanup
+        return path
+
+    @contextmanager
+    def build(self, key):
+        """Yields a scratch directory that becomes the entry on success."""
+        tmp = f"{self.path(key)}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            yield tmp
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        os.replace(tmp, self.path(key))
+        self.cleanup(keep=key)
+
+    @staticmethod
+    def _size(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+
+    def cleanup(self, keep=None):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not os.path.isdir(path):
+                continue
+            if ".tmp-" in name:
+                # Left by a crashed build; anything this old is not in progress
+                if time.time() - os.path.getmtime(path) > 24 * 3600:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            entries.append((os.path.getmtime(path), name, self._size(path)))
+        total = sum(size for _, _, size in entries)
+        for _, name, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            logger.info(f"Evicting cached corpus {name} ({size / 1024 ** 2:.0f} MiB)")
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            total -= size
@@ -0,0 +1,149 @@
+# ai/fast_tokenizer.py
+"""Compact replacement for the pickled Keras `Tokenizer`.
+
+Inference only needs the `num_words - 1` most frequent words, so the
+artefact (model/tokenizer.json) stores just those, as an array where a
+word's position is its id, plus the text-splitting settings and the OOV id.
+`FastTokenizer` gives exactly the ids Keras' `texts_to_sequences` does and
+can encode a batch straight into a padded int32 buffer.
+
+    python fast_tokenizer.py export model/tokenizer.joblib model/tokenizer.json
+    python fast_tokenizer.py check model/tokenizer.joblib model/tokenizer.json texts.csv
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from inference import MAXLEN
+
+FORMAT = "tokenizer/1"
+
+
+class FastTokenizer:
+    def __init__(self, words, num_words=None, oov_index=None,
+                 filters='!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n', lower=True, split=" "):
+        """`words[i]` has id i + 1; only ids below `num_words` are kept."""
+        self.words = list(words)
+        self.num_words = num_words
+        self.oov_index = oov_index
+        self.filters = filters
+        self.lower = lower
+        self.split = split
+        limit = num_words if num_words else len(self.words) + 1
+        self._ids = {w: i for i, w in enumerate(self.words[:limit - 1], start=1)}
+        self._table = str.maketrans({c: split for c in filters})
+
+    @classmethod
+    def from_keras(cls, tok):
+        if tok.char_level:
+            raise ValueError("char_level tokenizers are not supported")
+        limit = tok.num_words if tok.num_words else len(tok.word_index) + 1
+        # A vocabulary smaller than num_words leaves no gaps to fill
+        words = [None] * min(limit - 1, len(tok.word_index))
+        for w, i in tok.word_index.items():
+            if i < limit:
+                words[i - 1] = w
+        return cls(words, tok.num_words, tok.word_index.get(tok.oov_token) if tok.oov_token else None,
+                   tok.filters, tok.lower, tok.split)
+
+    def save(self, path):
+        doc = {"format": FORMAT, "num_words": self.num_words, "oov_index": self.oov_index,
+               "filters": self.filters, "lower": self.lower, "split": self.split, "words": self.words}
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            doc = json.load(f)
+        if doc.get("format") != FORMAT:
+            raise ValueError(f"{path}: unknown tokenizer format {doc.get('format')!r}")
+        return cls(doc["words"], doc["num_words"], doc["oov_index"], doc["filters"], doc["lower"], doc["split"])
+
+    def _ids_of(self, text):
+        # keras text_to_word_sequence + the num_words / OOV rules of
+        # texts_to_sequences
+        if self.lower:
+            text = text.lower()
+        get, oov = self._ids.get, self.oov_index
+        tokens = text.translate(self._table).split(self.split)
+        if oov is None:
+            return [i for i in map(get, filter(None, tokens)) if i is not None]
+        return [get(w, oov) for w in tokens if w]
+
+    def texts_to_sequences(self, texts):
+        return [self._ids_of(t) for t in texts]
+
+    def encode_batch(self, texts, maxlen=MAXLEN, out=None):
+        """Pre-padded, pre-truncated int32 ids, as pad_sequences would give.
+
+        Writes into `out` (shape (len(texts), maxlen)) when given.
+        """
+        if out is None:
+            out = np.zeros((len(texts), maxlen), dtype=np.int32)
+        else:
+            out[:] = 0
+        for row, text in zip(out, texts):
+            ids = self._ids_of(text)
+            if ids:
+                ids = ids[-maxlen:]
+                row[maxlen - len(ids):] = ids
+        return out
+
+
+def load_tokenizer(model_dir):
+    """The compact tokenizer if it has been exported, else the Keras pickle."""
+    path = os.path.join(model_dir, "tokenizer.json")
+    if os.path.exists(path):
+        return FastTokenizer.load(path)
+    import joblib
+    return joblib.load(os.path.join(model_dir, "tokenizer.joblib"))
+
+
+def check_parity(keras_tok, fast, texts):
+    """Compare ids for `texts`; returns the number of samples and mismatches
+    and the first mismatching text, if any."""
+    expected = keras_tok.texts_to_sequences(texts)
+    got = fast.texts_to_sequences(texts)
+    mismatches = [t for t, a, b in zip(texts, expected, got) if a != b]
+    return {"samples": len(texts), "mismatches": len(mismatches),
+            "first_mismatch": mismatches[0] if mismatches else None}
+
+
+if __name__ == "__main__":
+    import joblib
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    ex = sub.add_parser("export", help="write the compact artefact for a pickled Keras tokenizer")
+    ex.add_argument("keras_path")
+    ex.add_argument("out_path")
+    ck = sub.add_parser("check", help="compare both tokenizers on the text column of a CSV")
+    ck.add_argument("keras_path")
+    ck.add_argument("fast_path")
+    ck.add_argument("csv")
+    ck.add_argument("--limit", type=int, default=100000)
+    ck.add_argument("--no-clean", action="store_true", help="feed raw text (default: preprocess.clean first)")
+    args = parser.parse_args()
+
+    keras_tok = joblib.load(args.keras_path)
+    if args.command == "export":
+        fast = FastTokenizer.from_keras(keras_tok)
+        fast.save(args.out_path)
+        print(f"✓ {args.out_path}: {len(fast.words)} words, "
+              f"{os.path.getsize(args.out_path) / 1024:.0f} KiB "
+              f"(pickle: {os.path.getsize(args.keras_path) / 1024:.0f} KiB)")
+    else:
+        import pandas as pd
+        texts = pd.read_csv(args.csv, nrows=args.limit)["text"].astype(str).tolist()
+        if not args.no_clean:
+            from preprocess import clean_batch
+            texts = clean_batch(texts)
+        report = check_parity(keras_tok, FastTokenizer.load(args.fast_path), texts)
+        print(report)
+        if report["mismatches"]:
+            raise SystemExit(1)
@@ -0,0 +1,99 @@
+# ai/gpt_sentiment.py
+"""Sentiment labels from keywords and from GPT-4.
+
+`keyword_sentiment` is the cheap local check (see signals.py);
+`classify_with_gpt4` asks GPT-4 (function calling) for one of the seven
+labels the prompts are written for, falling back to the keywords when it
+answers "neutral".
+`gpt4_sentiment` wraps it with an optional cache and a neutral default.
+"""
+import json
+import logging
+import traceback
+
+import openai
+
+import signals
+
+logger = logging.getLogger(__name__)
+
+
+def keyword_sentiment(text):
+    """Strongest sentiment whose keywords appear in `text`, or None."""
+    return signals.top_sentiment(text)
+
+
+def classify_with_gpt4(text):
+    """One GPT-4 classification; raises on any API or parsing error."""
+    prompt = (
+        "Classify the sentiment of the following message as one of: happy, sad, angry, anxious, excited, neutral, or overwhelmed. "
+        "Respond in the format: label (confidence%), e.g., happy (95%).\n"
+        "If the message contains clear emotional words, never return 'neutral'.\n"
+        "Always pick the strongest emotion if multiple are present.\n"
+        "Examples:\n"
+        "Message: I feel so down today.\nOutput: sad (90%)\n"
+        "Message: I'm really excited for my trip!\nOutput: excited (98%)\n"
+        "Message: I'm just okay.\nOutput: neutral (80%)\n"
+        "Message: I'm feeling very stressed about school.\nOutput: anxious (95%)\n"
+        "Message: Everything is too much, I can't handle it.\nOutput: overwhelmed (97%)\n"
+        "Message: I'm so angry at my friend.\nOutput: angry (92%)\n"
+        "Message: I'm feeling annoyed with the amount of work I have to do recently. It's been so overwhelming. How can I calm myself down.\nOutput: overwhelmed (95%)\n"
+        "Message: I'm frustrated and upset about my workload.\nOutput: angry (90%)\n"
+        f"Message: {text}\nOutput:"
+    )
+    completion = openai.chat.completions.create(
+        model="gpt-4-1106-preview",
+        messages=[{"role": "system", "content": "You are a sentiment analysis assistant."}, {"role": "user", "content": prompt}],
+        functions=[
+            {
+                "name": "classify_sentiment",
+                "description": "Classify the sentiment of a message as one of: happy, sad, angry, anxious, excited, neutral, or overwhelmed. Return a confidence score (0-1).",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "label": {
+                            "type": "string",
+                            "enum": ["happy", "sad", "angry", "anxious", "excited", "neutral", "overwhelmed"],
+                            "description": "The sentiment label."
+                        },
+                        "confidence": {
+                            "type": "number",
+                            "minimum": 0,
+                            "maximum": 1,
+                            "description": "Confidence score between 0 and 1."
+                        }
+                    },
+                    "required": ["label", "confidence"]
+                }
+            }
+        ],
+        function_call={"name": "classify_sentiment"},
+        max_tokens=50,
+        temperature=0
+    )
+    args = completion.choices[0].message.function_call.arguments
+    result = json.loads(args)
+    label = result.get("label", "neutral")
+    conf = float(result.get("confidence", 0.8))
+    # Fallback heuristic: if label is neutral but text contains strong emotion words, pick strongest
+    if label == "neutral":
+        found = keyword_sentiment(text)
+        if found:
+            label = found
+            conf = 0.9
+    return label, conf
+
+
+def gpt4_sentiment(text, cache=None):
+    """classify_with_gpt4 that never raises: ("neutral", 0.8) on failure.
+
+    With a SentimentCache, repeated texts are answered from it; failures
+    are not cached.
+    """
+    try:
+        if cache is not None:
+            return cache.get_or_compute(text, classify_with_gpt4)
+        return classify_with_gpt4(text)
+    except Exception as e:
+        logger.error(traceback.format_exc())
+        return "neutral", 0.8
@@ -0,0 +1,179 @@
+# ai/history_cache.py
+"""Write-back cache in front of a storage backend (see storage.py).
+
+Keeps the most recent `window` entries of each active (kind, user) history
+in a bounded LRU so the conversation context is served from memory.
+Appends are acknowledged immediately and buffered; a background thread
+group-commits them every `flush_interval_ms` with one `append_history`
+call per user. Reads that need the full history (listing, paging, mood
+summaries) flush that user first, so they always see their own writes.
+
+The cache is per process and buffered appends are lost if the process
+dies before a flush, so app.py only enables it when HISTORY_CACHE_USERS is
+set; with several workers, also route each user to one worker.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryCache:
+    def __init__(self, store, max_users=1000, window=20, flush_interval_ms=250, max_pending=5000):
+        self.store = store
+        self.max_users = max(1, int(max_users))
+        self.window = max(1, int(window))
+        self.flush_interval = max(1, int(flush_interval_ms)) / 1000.0
+        self.max_pending = max(1, int(max_pending))
+        self._recent = OrderedDict()  # (kind, username) -> deque of the newest entries
+        self._pending = {}            # (kind, username) -> entries not yet written
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+        self._stop = threading.Event()
+        self._metrics = {"hits": 0, "misses": 0, "evictions": 0, "flushes": 0, "flushed_entries": 0,
+                         "flush_seconds_total": 0.0, "flush_seconds_max": 0.0}
+        self._thread = threading.Thread(target=self._run, name="history-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # -- storage interface -----------------------------------------------
+    def __getattr__(self, name):
+        # users and anything else the cache does not intercept
+        if name == "store":
+            raise AttributeError(name)
+        return getattr(self.store, name)
+
+    def recent_history(self, kind, username, n):
+        key = (kind, username)
+        if n > self.window:
+            self.flush(kind, username)
+            return self.store.recent_history(kind, username, n)
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is not None:
+                self._recent.move_to_end(key)
+                self._metrics["hits"] += 1
+                return list(recent)[-n:] if n else []
+            self._metrics["misses"] += 1
+        recent = self._load(key)
+        return list(recent)[-n:] if n else []
+
+    def append_history(self, kind, username, entries):
+        if not entries:
+            return
+        key = (kind, username)
+        if kind == "chat" and key not in self._recent:
+            self._load(key)  # keep the context window complete
+        with self._lock:
+            if key in self._recent:
+                self._recent[key].extend(entries)
+                self._recent.move_to_end(key)
+            self._pending.setdefault(key, []).extend(entries)
+            self._pending_count += len(entries)
+            overflow = self._pending_count >= self.max_pending
+        if overflow:
+            self.flush()
+
+    def load_history(self, kind, username):
+        self.flush(kind, username)
+        return self.store.load_history(kind, username)
+
+    def page_history(self, kind, username, limit, **cursor):
+        self.flush(kind, username)
+        return self.store.page_history(kind, username, limit, **cursor)
+
+    def mood_summary(self, username, period, limit):
+        self.flush("mood", username)
+        return self.store.mood_summary(username, period, limit)
+
+    def clear_history(self, kind, username):
+        key = (kind, username)
+        with self._flush_lock:
+            with self._lock:
+                self._pending_count -= len(self._pending.pop(key, []))
+                self._recent.pop(key, None)
+            self.store.clear_history(kind, username)
+
+    # -- internals -------------------------------------------------------
+    def _load(self, key):
+        kind, username = key
+        # Flush first so the window read from storage includes buffered
+        # appends; holding the flush lock keeps the flusher out until the
+        # window is installed
+        with self._flush_lock:
+            self.flush(kind, username)
+            recent = deque(self.store.recent_history(kind, username, self.window), maxlen=self.window)
+            with self._lock:
+                if key in self._recent:
+                    return self._recent[key]
+                recent.extend(self._pending.get(key, []))
+                self._recent[key] = recent
+                while len(self._recent) > self.max_users:
+                    self._recent.popitem(last=False)
+                    self._metrics["evictions"] += 1
+        return recent
+
+    def flush(self, kind=None, username=None):
+        """Write buffered appends: all of them, or only one (kind, user)."""
+        with self._flush_lock:
+            with self._lock:
+                if kind is None:
+                    batch, self._pending = self._pending, {}
+                else:
+                    entries = self._pending.pop((kind, username), None)
+                    batch = {(kind, username): entries} if entries else {}
+                self._pending_count -= sum(len(v) for v in batch.values())
+            if not batch:
+                return
+            start = time.perf_counter()
+            written = 0
+            for (k, user), entries in batch.items():
+                try:
+                    self.store.append_history(k, user, entries)
+                    written += len(entries)
+                except Exception as e:
+                    logger.error(f"History flush for {user} ({k}) failed, will retry: {e}")
+                    with self._lock:
+                        self._pending[(k, user)] = entries + self._pending.get((k, user), [])
+                        self._pending_count += len(entries)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                m = self._metrics
+                m["flushes"] += 1
+                m["flushed_entries"] += written
+                m["flush_seconds_total"] += elapsed
+                m["flush_seconds_max"] = max(m["flush_seconds_max"], elapsed)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"History flusher error: {e}")
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            m = dict(self._metrics)
+            lookups = m["hits"] + m["misses"]
+            return {
+                "cached_histories": len(self._recent),
+                "max_users": self.max_users,
+                "window": self.window,
+                "pending_entries": self._pending_count,
+                "hit_rate": m["hits"] / lookups if lookups else 0.0,
+                "hits": m["hits"],
+                "misses": m["misses"],
+                "evictions": m["evictions"],
+                "flushes": m["flushes"],
+                "flushed_entries": m["flushed_entries"],
+                "flush_ms_mean": 1000.0 * m["flush_seconds_total"] / m["flushes"] if m["flushes"] else 0.0,
+                "flush_ms_max": 1000.0 * m["flush_seconds_max"],
+            }
@@ -0,0 +1,323 @@
+# ai/history_log.py
+"""Append-only per-user history logs.
+
+Each user gets two files in the log directory:
+
+  <user>.jsonl  one JSON record per line, only ever appended to
+  <user>.idx    one fixed-size entry per record: (end offset, timestamp)
+
+The index lets `tail`, `read_range` and `page` seek straight to the records they
+need instead of parsing the whole history. Legacy `<user>.json` files are
+migrated the first time a user is touched, or all at once with
+
+    python history_log.py migrate model/chat_histories model/mood_histories
+"""
+import bisect
+import json
+import os
+import struct
+import sys
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+INDEX_ENTRY = struct.Struct("<Qq")  # end offset of the record, record timestamp
+
+
+class HistoryLog:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._locks = defaultdict(threading.RLock)
+        self._locks_guard = threading.Lock()
+        self._checked = set()
+
+    # -- paths / locking -------------------------------------------------
+    def data_path(self, username):
+        return os.path.join(self.directory, f"{username}.jsonl")
+
+    def index_path(self, username):
+        return os.path.join(self.directory, f"{username}.idx")
+
+    def legacy_path(self, username):
+        return os.path.join(self.directory, f"{username}.json")
+
+    def _lock(self, username):
+        with self._locks_guard:
+            return self._locks[username]
+
+    def _locked(self, username):
+        return _Locked(self._lock(username), _FileLock(self.index_path(username) + ".lock"))
+
+    @contextmanager
+    def locked(self, username):
+        """The user's in-process + cross-process lock, for callers that keep
+        files of their own in step with the log (use the *_locked methods)."""
+        with self._locked(username):
+            self._prepare(username)
+            yield
+
+    # -- consistency -----------------------------------------------------
+    def _ensure(self, username):
+        if username not in self._checked:
+            with self._locked(username):
+                self._prepare(username)
+
+    def _prepare(self, username):
+        """Migrate legacy JSON and repair an index left behind by a crash.
+
+        Must be called with the user's lock held.
+        """
+        if username in self._checked:
+            return
+        data, index = self.data_path(username), self.index_path(username)
+        legacy = self.legacy_path(username)
+        if not os.path.exists(data) and os.path.exists(legacy):
+            with open(legacy, "r") as f:
+                records = json.load(f)
+            self._write_all(username, records)
+            os.replace(legacy, legacy + ".migrated")
+        elif os.path.exists(data) and not self._index_consistent(data, index):
+            self._rebuild_index(username)
+        self._checked.add(username)
+
+    @staticmethod
+    def _index_consistent(data, index):
+        try:
+            data_size = os.path.getsize(data)
+            index_size = os.path.getsize(index)
+        except FileNotFoundError:
+            return False
+        if index_size % INDEX_ENTRY.size:
+            return False
+        if index_size == 0:
+            return data_size == 0
+        with open(index, "rb") as f:
+            f.seek(index_size - INDEX_ENTRY.size)
+            end, _ = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+        return end == data_size
+
+    def _rebuild_index(self, username):
+        entries = bytearray()
+        valid_end = 0
+        with open(self.data_path(username), "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn final write; dropped below
+                valid_end += len(line)
+                entries += INDEX_ENTRY.pack(valid_end, _timestamp(json.loads(line)))
+        with open(self.data_path(username), "r+b") as f:
+            f.truncate(valid_end)
+        with open(self.index_path(username), "wb") as f:
+            f.write(entries)
+
+    def _write_all(self, username, records):
+        tmp_data = self.data_path(username) + ".tmp"
+        tmp_index = self.index_path(username) + ".tmp"
+        end = 0
+        with open(tmp_data, "wb") as data, open(tmp_index, "wb") as index:
+            for record in records:
+                line = _encode(record)
+                data.write(line)
+                end += len(line)
+                index.write(INDEX_ENTRY.pack(end, _timestamp(record)))
+        os.replace(tmp_data, self.data_path(username))
+        os.replace(tmp_index, self.index_path(username))
+
+    # -- writes ----------------------------------------------------------
+    def append(self, username, records):
+        if not records:
+            return
+        with self._locked(username):
+            self.append_locked(username, records)
+
+    def append_locked(self, username, records):
+        """append() with the user's lock held; returns the record count."""
+        self._prepare(username)
+        if records:
+            lines = [_encode(r) for r in records]
+            with open(self.data_path(username), "ab") as data:
+                end = data.tell()
+                data.write(b"".join(lines))
+            index = bytearray()
+            for record, line in zip(records, lines):
+                end += len(line)
+                index += INDEX_ENTRY.pack(end, _timestamp(record))
+            # The index is written after the data, so a crash in between
+            # leaves unindexed records that _rebuild_index recovers
+            with open(self.index_path(username), "ab") as f:
+                f.write(index)
+        return self.count(username)
+
+    def rewrite(self, username, records):
+        with self._locked(username):
+            self.rewrite_locked(username, records)
+
+    def rewrite_locked(self, username, records):
+        self._write_all(username, records)
+        self._checked.add(username)
+
+    def clear(self, username):
+        self.rewrite(username, [])
+
+    # -- reads -----------------------------------------------------------
+    def count(self, username):
+        self._ensure(username)
+        try:
+            return os.path.getsize(self.index_path(username)) // INDEX_ENTRY.size
+        except FileNotFoundError:
+            return 0
+
+    def _offsets(self, username, start, stop):
+        """Byte range covering records [start, stop)."""
+        with open(self.index_path(username), "rb") as f:
+            if start > 0:
+                f.seek((start - 1) * INDEX_ENTRY.size)
+                begin, _ = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+            else:
+                begin = 0
+            f.seek((stop - 1) * INDEX_ENTRY.size)
+            end, _ = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+        return begin, end
+
+    def read_range(self, username, start, stop):
+        """Records with positions in [start, stop), oldest first."""
+        with self._lock(username):
+            total = self.count(username)
+            start, stop = max(0, start), min(stop, total)
+            if start >= stop:
+                return []
+            begin, end = self._offsets(username, start, stop)
+            with open(self.data_path(username), "rb") as f:
+                f.seek(begin)
+                chunk = f.read(end - begin)
+        return [json.loads(line) for line in chunk.splitlines()]
+
+    def tail(self, username, n):
+        total = self.count(username)
+        return self.read_range(username, total - n, total)
+
+    def read_all(self, username):
+        return self.read_range(username, 0, self.count(username))
+
+    def iter_records(self, username):
+        """Stream every indexed record without loading the whole log."""
+        total = self.count(username)
+        if not total:
+            return
+        _, end = self._offsets(username, 0, total)
+        with open(self.data_path(username), "rb") as f:
+            while f.tell() < end:
+                yield json.loads(f.readline())
+
+    def page(self, username, limit, before=None, after=None, since=None, until=None):
+        """One page of records, oldest first, each tagged with its 1-based `id`.
+
+        `before`/`after` are exclusive id cursors and `since`/`until` bound
+        the timestamp (inclusive / exclusive). Without `after` the newest
+        matching page is returned. Time bounds are resolved by binary search
+        over the index, which assumes records are appended in time order.
+        Returns `(records, has_more)`.
+        """
+        with self._lock(username):
+            total = self.count(username)
+            lo = 0 if after is None else max(0, after)
+            hi = total if before is None else min(total, before - 1)
+            if (since is not None or until is not None) and total:
+                with open(self.index_path(username), "rb") as f:
+                    timestamps = _TimestampView(f, total)
+                    if since is not None:
+                        lo = max(lo, bisect.bisect_left(timestamps, since))
+                    if until is not None:
+                        hi = min(hi, bisect.bisect_left(timestamps, until))
+            if lo >= hi:
+                return [], False
+            if after is not None:
+                start, stop = lo, min(hi, lo + limit)
+                has_more = stop < hi
+            else:
+                start, stop = max(lo, hi - limit), hi
+                has_more = start > lo
+            records = self.read_range(username, start, stop)
+        return [dict(r, id=start + i + 1) for i, r in enumerate(records)], has_more
+
+    # -- migration -------------------------------------------------------
+    def migrate_all(self):
+        migrated = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                username = name[:-len(".json")]
+                self._checked.discard(username)
+                self._ensure(username)
+                migrated += 1
+        return migrated
+
+
+class _TimestampView:
+    """Read-only sequence over the timestamps in an open index file."""
+
+    def __init__(self, f, length):
+        self.f = f
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        self.f.seek(i * INDEX_ENTRY.size)
+        return INDEX_ENTRY.unpack(self.f.read(INDEX_ENTRY.size))[1]
+
+
+class _FileLock:
+    """Cross-process lock so several workers can append to one user's log."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.f = open(self.path, "ab")
+        if fcntl:
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+
+class _Locked:
+    def __init__(self, *locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        for lock in reversed(self.locks):
+            lock.__exit__(*exc)
+
+
+def _encode(record):
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _timestamp(record):
+    try:
+        return int(record.get("timestamp", 0))
+    except (TypeError, ValueError, AttributeError):
+        return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "migrate":
+        sys.exit("usage: python history_log.py migrate DIR [DIR ...]")
+    for directory in sys.argv[2:]:
+        print(f"{directory}: migrated {HistoryLog(directory).migrate_all()} users")
@@ -0,0 +1,134 @@
+# ai/inference.py
+"""Sentiment model runtimes.
+
+The Keras runtime loads `model/sentiment.h5` through TensorFlow. The TFLite
+runtime loads the compact artefact written by `export_tflite` and only needs
+`tflite-runtime` (or `ai-edge-litert`) + NumPy; TensorFlow is used as a last
+resort if neither is installed.
+"""
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAXLEN = 120
+
+
+def pad_sequences(seqs, maxlen=MAXLEN):
+    """NumPy equivalent of keras `pad_sequences` with the default
+    pre-padding / pre-truncating and int32 output."""
+    out = np.zeros((len(seqs), maxlen), dtype=np.int32)
+    for i, seq in enumerate(seqs):
+        if seq:
+            seq = seq[-maxlen:]
+            out[i, -len(seq):] = seq
+    return out
+
+
+class KerasSentimentModel:
+    def __init__(self, model):
+        self.model = model
+
+    @classmethod
+    def load(cls, path):
+        import tensorflow as tf
+        return cls(tf.keras.models.load_model(path))
+
+    def predict(self, x, batch_size=None):
+        if batch_size is None or len(x) <= batch_size:
+            return np.asarray(self.model(x, training=False))
+        return self.model.predict(x, batch_size=batch_size, verbose=0)
+
+
+def _interpreter_class():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    logger.warning("tflite-runtime not installed; falling back to tf.lite.Interpreter")
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteSentimentModel:
+    """Runs an exported `.tflite` sentiment model.
+
+    The interpreter is not thread-safe, so calls are serialised, one chunk
+    of at most `max_batch` rows at a time: other callers (the micro-batcher)
+    get a turn between the chunks of a large job. The input tensor is only
+    resized when the batch size changes.
+    """
+
+    def __init__(self, path, num_threads=None, max_batch=256):
+        self.path = path
+        self.max_batch = max_batch
+        self.interpreter = _interpreter_class()(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._shape = None
+        self._lock = threading.Lock()
+
+    def _run(self, chunk):
+        shape = list(chunk.shape)
+        if shape != self._shape:
+            self.interpreter.resize_tensor_input(self._input["index"], shape)
+            self.interpreter.allocate_tensors()
+            self._shape = shape
+        self.interpreter.set_tensor(self._input["index"], chunk.astype(self._input["dtype"], copy=False))
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self._output["index"]).copy()
+
+    def predict(self, x, batch_size=None):
+        batch_size = min(batch_size or self.max_batch, self.max_batch)
+        outputs = []
+        for start in range(0, len(x), batch_size):
+            with self._lock:  # released between chunks
+                outputs.append(self._run(x[start:start + batch_size]))
+        return np.concatenate(outputs) if outputs else np.zeros((0, self._output["shape"][-1]), np.float32)
+
+
+def load_sentiment_model(runtime, keras_path, tflite_path, num_threads=None):
+    if runtime == "keras":
+        return KerasSentimentModel.load(keras_path)
+    if runtime == "tflite":
+        return TFLiteSentimentModel(tflite_path, num_threads=num_threads)
+    raise ValueError(f"Unknown sentiment runtime: {runtime!r}")
+
+
+def export_tflite(model, path, maxlen=MAXLEN, quantize=False):
+    """Convert a Keras sentiment model to TFLite with a dynamic batch dimension.
+
+    With `quantize=True` the weights are stored as int8 (dynamic-range
+    quantisation), which shrinks the Embedding table roughly 4x.
+    """
+    import tensorflow as tf
+
+    run = tf.function(lambda x: model(x, training=False))
+    concrete = run.get_concrete_function(tf.TensorSpec([None, maxlen], tf.int32))
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], model)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+
+def check_parity(reference, candidate, x, batch_size=256):
+    """Compare two runtimes on the same padded inputs."""
+    ref = reference.predict(x, batch_size=batch_size)
+    got = candidate.predict(x, batch_size=batch_size)
+    return {
+        "samples": int(len(x)),
+        "label_agreement": float((ref.argmax(axis=1) == got.argmax(axis=1)).mean()) if len(x) else 1.0,
+        "max_abs_diff": float(np.abs(ref - got).max()) if len(x) else 0.0,
+    }
@@ -0,0 +1,54 @@
+# ai/mood_rollups.py
+"""Daily / weekly mood aggregates.
+
+A rollup document maps period -> bucket -> counters:
+
+    {"day":  {"2026-10-18": {"count": 3, "confidence_sum": 2.4, "sentiments": {"sad": 2, "happy": 1}}},
+     "week": {"2026-W42":   {...}}}
+
+Buckets are UTC calendar days and ISO weeks. Documents are updated one
+mood entry at a time, so keeping them current costs O(1) per message.
+"""
+from datetime import datetime, timezone
+
+PERIODS = ("day", "week")
+
+
+def bucket_key(timestamp, period):
+    d = datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
+    if period == "day":
+        return d.strftime("%Y-%m-%d")
+    if period == "week":
+        year, week, _ = d.isocalendar()
+        return f"{year}-W{week:02d}"
+    raise ValueError(f"Unknown period: {period!r}")
+
+
+def deltas(entries):
+    """(period, bucket, sentiment, confidence) for every period an entry counts in."""
+    for e in entries:
+        for period in PERIODS:
+            yield period, bucket_key(e.get("timestamp", 0), period), e.get("sentiment", "neutral"), float(e.get("confidence", 0.0))
+
+
+def add_entries(doc, entries):
+    for period, bucket, sentiment, confidence in deltas(entries):
+        b = doc.setdefault(period, {}).setdefault(bucket, {"count": 0, "confidence_sum": 0.0, "sentiments": {}})
+        b["count"] += 1
+        b["confidence_sum"] += confidence
+        b["sentiments"][sentiment] = b["sentiments"].get(sentiment, 0) + 1
+    return doc
+
+
+def summarize(buckets, limit):
+    """Newest `limit` buckets of one period, oldest first, with mean confidence."""
+    keys = sorted(buckets)[-limit:]
+    return [
+        {
+            "bucket": k,
+            "count": buckets[k]["count"],
+            "mean_confidence": buckets[k]["confidence_sum"] / buckets[k]["count"] if buckets[k]["count"] else 0.0,
+            "sentiments": buckets[k]["sentiments"],
+        }
+        for k in keys
+    ]
@@ -0,0 +1,34 @@
+# ai/prefork.py
+"""Fork all the workers of a fork-context ProcessPoolExecutor up front.
+
+The executor forks its workers on the first submit and starts a manager
+thread right after, so once one pool has taken work, forking another copies
+a process with a live thread (and whatever locks that thread holds). Forking
+every pool's workers first, before anything is submitted to any of them,
+keeps every fork single-threaded.
+"""
+import logging
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+
+def fork_context():
+    """The "fork" start method, or None where the platform has none (Windows)."""
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def fork_workers(executor):
+    # _spawn_process is what submit() uses (Python 3.9-3.13), but it is
+    # private; without it the first submit forks the workers as usual
+    spawn = getattr(executor, "_spawn_process", None)
+    processes = getattr(executor, "_processes", None)
+    workers = getattr(executor, "_max_workers", None)
+    if spawn is None or processes is None or workers is None:
+        logger.warning("Cannot fork pool workers up front; they will fork on first use")
+        return executor
+    for _ in range(len(processes), workers):
+        spawn()
+    return executor
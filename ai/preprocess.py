@@ -1,14 +1,81 @@
 # ai/preprocess.py
-import re, string, emoji, nltk
-from nltk.corpus import stopwords
+import re, string, sys, emoji
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
-nltk.download("stopwords", quiet=True)
-STOP = set(stopwords.words("english"))
+# Bump when clean()'s output changes; cached corpora are keyed on it
+CLEAN_VERSION = 1
+
+URL_RE = re.compile(r"http\S+")
+PUNCT_TABLE = str.maketrans('', '', string.punctuation)
+
+def _codepoint_class(chars):
+    """Regex character class for `chars`, as ranges (a long list is slow)."""
+    ranges = []
+    for cp in sorted({ord(c) for c in chars}):
+        if ranges and cp == ranges[-1][1] + 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    return "[" + "".join(re.escape(chr(a)) if a == b else f"{re.escape(chr(a))}-{re.escape(chr(b))}"
+                         for a, b in ranges) + "]"
+
+# No emoji is pure ASCII, so replace_emoji() leaves a text alone unless it
+# has one of these characters; checking first skips its slow tokenizer
+EMOJI_CHARS_RE = re.compile(_codepoint_class(c for e in emoji.EMOJI_DATA for c in e if ord(c) > 127))
+
+def _strip_emoji(text):
+    if text.isascii() or not EMOJI_CHARS_RE.search(text):
+        return text
+    return emoji.replace_emoji(text, replace='')
+
+@lru_cache(maxsize=None)
+def stopwords():
+    """NLTK's English stopwords, downloaded on first use: importing this
+    module (e.g. for normalize) must not need the network or NLTK data."""
+    import nltk
+    from nltk.corpus import stopwords as corpus
+
+    nltk.download("stopwords", quiet=True)
+    return frozenset(corpus.words("english"))
+
+def normalize(text: str) -> str:
+    """clean() without the stopword removal (keeps negations like "not")."""
+    text = _strip_emoji(text)
+    text = URL_RE.sub("", text)                         # strip URLs
+    text = text.translate(PUNCT_TABLE)
+    return " ".join(t.lower() for t in text.split())
 
 def clean(text: str) -> str:
     """Basic Twitter / Reddit style cleaning."""
-    text = emoji.replace_emoji(text, replace='')
-    text = re.sub(r"http\S+", "", text)                 # strip URLs
-    text = text.translate(str.maketrans('', '', string.punctuation))
-    toks = [t.lower() for t in text.split() if t.lower() not in STOP]
+    stop = stopwords()
+    toks = [t for t in normalize(text).split() if t not in stop]
     return " ".join(toks)
+
+def _clean_chunk(texts):
+    # clean() inlined with everything bound locally; lower() on the whole
+    # string gives the same tokens as lowering each one
+    strip, sub, table, stop = _strip_emoji, URL_RE.sub, PUNCT_TABLE, stopwords()
+    return [" ".join([t for t in sub("", strip(x)).translate(table).lower().split() if t not in stop])
+            for x in texts]
+
+def clean_batch(texts, workers=None, chunksize=50000):
+    """clean() over a whole corpus; same output, much faster.
+
+    Chunks of `chunksize` rows are cleaned in a pool of `workers` processes
+    (default: one per CPU; 1 = in this process). A pandas Series comes back
+    as a Series with the same index, anything else as a list.
+    """
+    stopwords()  # loaded once here rather than in every worker
+    pd = sys.modules.get("pandas")
+    index = texts.index if pd is not None and isinstance(texts, pd.Series) else None
+    texts = list(texts)
+    chunks = [texts[i:i + chunksize] for i in range(0, len(texts), chunksize)]
+    if workers == 1 or len(chunks) <= 1:
+        out = [t for chunk in chunks for t in _clean_chunk(chunk)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            out = [t for cleaned in pool.map(_clean_chunk, chunks) for t in cleaned]
+    if index is not None:
+        return pd.Series(out, index=index, dtype=object)
+    return out
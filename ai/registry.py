@@ -0,0 +1,69 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Named, lazily loaded model handles.
+
+    Each entry is loaded on first `get` (or by `warmup`) exactly once; a
+    failed load is recorded and retried on the next `get`.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._status = {}
+        self._locks = {}
+
+    def register(self, name, loader):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+        self._status[name] = {"ready": False, "loading": False, "load_seconds": None, "error": None}
+
+    def get(self, name):
+        if name in self._models:
+            return self._models[name]
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+            status = self._status[name]
+            status["loading"] = True
+            start = time.perf_counter()
+            try:
+                obj = self._loaders[name]()
+            except Exception as e:
+                status.update(loading=False, error=str(e))
+                logger.error(f"Failed to load model '{name}': {e}")
+                raise
+            elapsed = time.perf_counter() - start
+            self._models[name] = obj
+            status.update(ready=True, loading=False, load_seconds=round(elapsed, 3), error=None)
+            logger.info(f"Loaded model '{name}' in {elapsed:.2f}s")
+            return obj
+
+    def is_ready(self, name):
+        return name in self._models
+
+    def warmup(self, names=None, background=True):
+        names = list(self._loaders) if names is None else names
+
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    pass  # already logged; the request path will retry
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self, names=None):
+        names = list(self._loaders) if names is None else names
+        return {name: dict(self._status[name]) for name in names}
@@ -0,0 +1,195 @@
+# ai/sentiment_cache.py
+"""TTL + LRU cache of sentiment results, keyed on normalized text.
+
+Short messages ("I'm stressed", "feeling down", greetings) repeat across
+users all day; each repeat would otherwise be a GPT-4 round trip. Texts
+are keyed on `preprocess.normalize` (the cleaning without stopword
+removal, so "not happy" and "happy" stay apart). Results live in memory
+and, optionally, in a SQLite file shared by every worker process on the
+host. Concurrent lookups of the same key wait for one in-flight call;
+failures are never cached.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from preprocess import normalize
+
+logger = logging.getLogger(__name__)
+
+
+class SentimentCache:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sentiment_cache (
+        key TEXT PRIMARY KEY,
+        label TEXT NOT NULL,
+        confidence REAL NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS sentiment_cache_expires ON sentiment_cache (expires_at);
+    """
+
+    def __init__(self, max_entries=10000, ttl=24 * 3600, shared_path=None, key=normalize,
+                 shared_max_entries=100000, prune_interval=60.0):
+        """The shared table is pruned of expired rows, and down to
+        `shared_max_entries` (oldest first), at most every `prune_interval`
+        seconds per process, on write."""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared_path = shared_path
+        self.shared_max_entries = shared_max_entries
+        self.prune_interval = prune_interval
+        self._last_prune = 0.0
+        self._key = key
+        self._entries = OrderedDict()  # key -> (expires_at, label, confidence), LRU first
+        self._inflight = {}            # key -> Future
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._metrics = {"hits": 0, "shared_hits": 0, "misses": 0, "coalesced": 0, "failures": 0, "evictions": 0,
+                         "shared_errors": 0}
+        if shared_path:
+            with self._conn() as conn:
+                conn.executescript(self.SCHEMA)
+            self._prune()
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections must not be shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.shared_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get_local(self, key, now):
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1], entry[2]
+
+    def _put_local(self, key, expires_at, result):
+        # Caller holds the lock
+        self._entries[key] = (expires_at, result[0], result[1])
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._metrics["evictions"] += 1
+
+    def _get_shared(self, key, now):
+        row = self._conn().execute(
+            "SELECT label, confidence, expires_at FROM sentiment_cache WHERE key = ? AND expires_at >= ?",
+            (key, now),
+        ).fetchone()
+        return row
+
+    def _put_shared(self, key, expires_at, result):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sentiment_cache (key, label, confidence, expires_at) VALUES (?, ?, ?, ?)",
+                (key, result[0], result[1], expires_at),
+            )
+        if time.monotonic() - self._last_prune >= self.prune_interval:
+            self._prune()
+
+    def _prune(self):
+        self._last_prune = time.monotonic()
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sentiment_cache WHERE expires_at < ?", (time.time(),))
+            # Every row has the same TTL, so the soonest to expire are the oldest
+            conn.execute(
+                "DELETE FROM sentiment_cache WHERE key IN "
+                "(SELECT key FROM sentiment_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.shared_max_entries,),
+            )
+
+    def _shared_error(self, action, e):
+        # The shared store is only an optimisation; a result in hand is kept
+        logger.warning(f"Shared sentiment cache {action} failed: {e}")
+        with self._lock:
+            self._metrics["shared_errors"] += 1
+
+    def get_or_compute(self, text, compute):
+        """Cached `compute(text)` -> (label, confidence). Exceptions from
+        `compute` propagate to every waiting caller and are not cached."""
+        key = self._key(text)
+        if not key:
+            return compute(text)
+        now = time.time()
+        with self._lock:
+            result = self._get_local(key, now)
+            if result is not None:
+                self._metrics["hits"] += 1
+                return result
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self._metrics["coalesced"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            row = None
+            if self.shared_path:
+                try:
+                    row = self._get_shared(key, now)
+                except sqlite3.Error as e:
+                    self._shared_error("read", e)
+            if row is not None:
+                result, expires_at = (row[0], row[1]), row[2]
+                with self._lock:
+                    self._metrics["shared_hits"] += 1
+                    self._put_local(key, expires_at, result)
+            else:
+                with self._lock:
+                    self._metrics["misses"] += 1
+                result = tuple(compute(text))
+                expires_at = time.time() + self.ttl
+                with self._lock:
+                    self._put_local(key, expires_at, result)
+                if self.shared_path:
+                    try:
+                        self._put_shared(key, expires_at, result)
+                    except Exception as e:
+                        self._shared_error("write", e)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            with self._lock:
+                self._metrics["failures"] += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.shared_path:
+            with self._conn() as conn:
+                conn.execute("DELETE FROM sentiment_cache")
+
+    def stats(self):
+        with self._lock:
+            m = dict(self._metrics)
+            lookups = m["hits"] + m["shared_hits"] + m["misses"] + m["coalesced"]
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "shared": bool(self.shared_path),
+                "shared_max_entries": self.shared_max_entries if self.shared_path else None,
+                "hit_rate": (m["hits"] + m["shared_hits"] + m["coalesced"]) / lookups if lookups else 0.0,
+                **m,
+            }
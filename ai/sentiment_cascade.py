@@ -0,0 +1,245 @@
+# ai/sentiment_cascade.py
+"""Tiered sentiment: keywords -> local Bi-LSTM -> GPT-4.
+
+Each tier is tried in order and the first confident answer wins:
+
+1. keywords  - the emotion keywords agree on one sentiment, with no
+               negation and not only ambiguous words (signals.
+               confident_sentiment; free, microseconds)
+2. local     - the trained model is at least `threshold` confident
+3. gpt       - everything else goes to the network
+
+Per-tier hit counts and latencies are kept for /metrics. Run this module
+against a labelled CSV (columns text,label) to see the accuracy / GPT-call
+trade-off at different thresholds, with and without the keyword tier:
+
+    python sentiment_cascade.py eval data.csv [--thresholds 0.5,0.7,0.9]
+        [--gpt-cache gpt_labels.jsonl] [--no-gpt] [--keyword-tier on|off|both]
+
+--gpt-cache stores GPT answers so repeated sweeps don't pay for them again;
+--no-gpt scores the GPT tier as always right (an upper bound).
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("keywords", "local", "gpt")
+
+
+class SentimentCascade:
+    def __init__(self, keywords, local, remote, threshold=0.85, keyword_confidence=0.9):
+        """`keywords(text)` -> label or None (None skips the tier); `local`
+        and `remote(text)` -> (label, confidence). A failing local tier
+        escalates to `remote`."""
+        self.keywords = keywords
+        self.local = local
+        self.remote = remote
+        self.threshold = threshold
+        self.keyword_confidence = keyword_confidence
+        self._lock = threading.Lock()
+        self._metrics = {tier: {"hits": 0, "seconds": 0.0} for tier in TIERS}
+        self._local_errors = 0
+        self._requests = 0
+
+    def _record(self, tier, seconds):
+        with self._lock:
+            self._metrics[tier]["hits"] += 1
+            self._metrics[tier]["seconds"] += seconds
+
+    def classify(self, text):
+        """Returns (label, confidence, tier)."""
+        with self._lock:
+            self._requests += 1
+        start = time.perf_counter()
+        label = self.keywords(text) if self.keywords is not None else None
+        if label:
+            self._record("keywords", time.perf_counter() - start)
+            return label, self.keyword_confidence, "keywords"
+        try:
+            label, conf = self.local(text)
+            if conf >= self.threshold:
+                self._record("local", time.perf_counter() - start)
+                return label, conf, "local"
+        except Exception as e:
+            # Model still loading, batcher timeout, ...: let GPT answer
+            logger.warning(f"Local sentiment failed, escalating: {e}")
+            with self._lock:
+                self._local_errors += 1
+        label, conf = self.remote(text)
+        self._record("gpt", time.perf_counter() - start)
+        return label, conf, "gpt"
+
+    def stats(self):
+        with self._lock:
+            n = self._requests
+            return {
+                "threshold": self.threshold,
+                "keyword_tier": self.keywords is not None,
+                "requests": n,
+                "local_errors": self._local_errors,
+                "tiers": {
+                    tier: {
+                        "hits": m["hits"],
+                        "hit_rate": m["hits"] / n if n else 0.0,
+                        # time to answer, including the tiers tried before
+                        "ms_mean": 1000.0 * m["seconds"] / m["hits"] if m["hits"] else 0.0,
+                    }
+                    for tier, m in self._metrics.items()
+                },
+            }
+
+
+# -- offline evaluation ---------------------------------------------------
+def _local_predictions(texts, model_dir):
+    import joblib
+    from fast_tokenizer import FastTokenizer, load_tokenizer
+    from inference import load_sentiment_model, pad_sequences
+
+    tok = load_tokenizer(model_dir)
+    enc = joblib.load(os.path.join(model_dir, "label_encoder.joblib"))
+    model = load_sentiment_model(
+        os.environ.get("SENTIMENT_RUNTIME", "keras"),
+        keras_path=os.path.join(model_dir, "sentiment.h5"),
+        tflite_path=os.environ.get("SENTIMENT_TFLITE_PATH", os.path.join(model_dir, "sentiment.tflite")),
+    )
+    start = time.perf_counter()
+    if isinstance(tok, FastTokenizer):
+        x = tok.encode_batch(texts, maxlen=120)
+    else:
+        x = pad_sequences(tok.texts_to_sequences(texts), maxlen=120)
+    probs = model.predict(x)
+    per_text = (time.perf_counter() - start) / max(len(texts), 1)
+    labels = enc.inverse_transform(probs.argmax(axis=1))
+    return [(str(l), float(c)) for l, c in zip(labels, probs.max(axis=1))], per_text
+
+
+def _gpt_predictions(texts, cache_path):
+    from dotenv import load_dotenv
+    import openai
+    from gpt_sentiment import classify_with_gpt4
+
+    load_dotenv()
+    openai.api_key = os.environ.get("OPENAI_API_KEY")
+    cached = {}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                cached[row["text"]] = row
+    out = open(cache_path, "a", encoding="utf-8") if cache_path else None
+    results, seconds, calls = [], 0.0, 0
+    try:
+        for text in texts:
+            row = cached.get(text)
+            if row is None:
+                start = time.perf_counter()
+                try:
+                    label, conf = classify_with_gpt4(text)
+                    failed = False
+                except Exception as e:
+                    # Scored as the app would answer, but not cached
+                    logger.warning(f"GPT-4 failed for {text[:40]!r}: {e}")
+                    label, conf, failed = "neutral", 0.8, True
+                row = {"text": text, "label": label, "confidence": conf, "seconds": time.perf_counter() - start}
+                if not failed:
+                    cached[text] = row
+                    if out:
+                        out.write(json.dumps(row) + "\n")
+            seconds += row["seconds"]
+            calls += 1
+            results.append(row["label"])
+    finally:
+        if out:
+            out.close()
+    return results, seconds / max(calls, 1)
+
+
+def evaluate(texts, gold, thresholds, model_dir, gpt_cache=None, use_gpt=True, keyword_tiers=(True, False)):
+    from signals import confident_sentiment
+
+    start = time.perf_counter()
+    keyword = [confident_sentiment(t) for t in texts]
+    kw_seconds = (time.perf_counter() - start) / max(len(texts), 1)
+    local, local_seconds = _local_predictions(texts, model_dir)
+    if use_gpt:
+        remote, gpt_seconds = _gpt_predictions(texts, gpt_cache)
+    else:
+        remote, gpt_seconds = list(gold), 0.0
+
+    n = len(texts)
+    kw_hits = [(k, g) for k, g in zip(keyword, gold) if k]
+    rows = [{
+        "threshold": "gpt-only",
+        "keyword_tier": False,
+        "accuracy": sum(r == g for r, g in zip(remote, gold)) / n,
+        "gpt_share": 1.0,
+        "keyword_share": 0.0,
+        "keyword_accuracy": None,
+        "local_share": 0.0,
+        "est_ms_per_message": 1000.0 * gpt_seconds,
+    }]
+    for use_keywords, threshold in ((k, t) for k in keyword_tiers for t in thresholds):
+        correct = tiers_kw = tiers_local = tiers_gpt = 0
+        for kw, (l_label, l_conf), r, g in zip(keyword, local, remote, gold):
+            if use_keywords and kw:
+                label, tiers_kw = kw, tiers_kw + 1
+            elif l_conf >= threshold:
+                label, tiers_local = l_label, tiers_local + 1
+            else:
+                label, tiers_gpt = r, tiers_gpt + 1
+            correct += label == g
+        ms = 1000.0 * ((n * kw_seconds if use_keywords else 0.0)
+                       + (tiers_local + tiers_gpt) * local_seconds + tiers_gpt * gpt_seconds) / n
+        rows.append({
+            "threshold": threshold,
+            "keyword_tier": use_keywords,
+            "accuracy": correct / n,
+            "gpt_share": tiers_gpt / n,
+            "keyword_share": tiers_kw / n,
+            # how often the keyword tier is right when it answers
+            "keyword_accuracy": (sum(k == g for k, g in kw_hits) / len(kw_hits)
+                                 if use_keywords and kw_hits else None),
+            "local_share": tiers_local / n,
+            "est_ms_per_message": ms,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    ev = sub.add_parser("eval", help="sweep thresholds over a labelled CSV (text,label)")
+    ev.add_argument("csv")
+    ev.add_argument("--thresholds", default="0.5,0.6,0.7,0.8,0.85,0.9,0.95")
+    ev.add_argument("--model-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "model"))
+    ev.add_argument("--gpt-cache")
+    ev.add_argument("--no-gpt", action="store_true")
+    ev.add_argument("--limit", type=int)
+    ev.add_argument("--keyword-tier", choices=("on", "off", "both"), default="both",
+                    help="score the cascade with the keyword tier, without it, or both")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv, nrows=args.limit)
+    rows = evaluate(
+        df["text"].astype(str).tolist(),
+        df["label"].astype(str).tolist(),
+        [float(t) for t in args.thresholds.split(",")],
+        args.model_dir,
+        gpt_cache=args.gpt_cache,
+        use_gpt=not args.no_gpt,
+        keyword_tiers={"on": (True,), "off": (False,), "both": (True, False)}[args.keyword_tier],
+    )
+    print(f"{'threshold':>10} {'kw tier':>7} {'accuracy':>9} {'keywords':>9} {'kw acc':>7} "
+          f"{'local':>7} {'gpt':>7} {'ms/msg':>8}")
+    for r in rows:
+        t = r["threshold"] if isinstance(r["threshold"], str) else f"{r['threshold']:.2f}"
+        kw_acc = "-" if r["keyword_accuracy"] is None else f"{r['keyword_accuracy']:.3f}"
+        print(f"{t:>10} {'on' if r['keyword_tier'] else 'off':>7} {r['accuracy']:9.3f} {r['keyword_share']:9.1%} "
+              f"{kw_acc:>7} {r['local_share']:7.1%} {r['gpt_share']:7.1%} {r['est_ms_per_message']:8.1f}")
@@ -0,0 +1,223 @@
+# ai/signals.py
+"""Keyword signals found in one scan of a message.
+
+Friendly-intent phrases (greetings, thanks, goodbyes) and emotion keywords
+are compiled together into a single trie-shaped regular expression: the
+phrases share prefixes the way an Aho-Corasick goto graph does, and the
+re engine walks it in C. A zero-width lookahead reports every phrase
+starting at each position, so overlapping phrases are all found, and
+matches must sit on word boundaries ("mad" does not match "made").
+
+The tables default to the ones below and can be replaced by a JSON file
+(same keys as DEFAULT_TABLES), which is reloaded when its mtime changes;
+`reload()` forces it.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TABLES = {
+    "friendly": [
+        "hi", "hello", "hey", "good morning", "good afternoon", "good evening",
+        "thank", "thanks", "thank you", "thank u", "appreciate", "grateful",
+        "bye", "goodbye", "see you", "take care", "later", "ciao", "adios",
+    ],
+    "sentiment_keywords": {
+        "anxious": ["stressed", "anxious", "worried", "nervous", "overwhelmed", "panic", "afraid", "scared"],
+        # inflections the old substring scan used to catch ("cry" in "crying")
+        "sad": ["sad", "down", "depressed", "unhappy", "hopeless", "cry", "crying", "cried"],
+        "angry": ["angry", "mad", "furious", "irritated", "annoyed", "frustrated", "resentful", "upset", "bothered"],
+        "happy": ["happy", "joyful", "excited", "glad", "content", "pleased"],
+        "overwhelmed": ["overwhelmed", "burned out", "too much", "can't handle", "exhausted", "swamped", "burdened", "drowning"],
+    },
+    # strongest first
+    "priority": ["overwhelmed", "angry", "anxious", "sad", "happy"],
+    # keywords that don't decide a sentiment on their own ("calm down",
+    # "the content of my essay", "mad busy")
+    "ambiguous": ["down", "content", "mad"],
+    # a keyword up to NEGATION_WINDOW words after one of these ("not happy",
+    # "never really glad") says little about the sentiment
+    "negators": ["not", "no", "never", "nothing", "nobody", "hardly", "barely", "without", "cannot"],
+}
+NEGATION_WINDOW = 3
+
+Signals = namedtuple("Signals", "friendly sentiments")  # sentiments: labels in priority order
+_WORD_RE = re.compile(r"[\w']+")
+
+
+def _fold(text):
+    # Case and typographic apostrophes ("can\u2019t") fold the same way for
+    # the tables and every message, so all callers see the same matches
+    return text.lower().replace("\u2019", "'")
+
+
+def _trie_pattern(phrases):
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = True  # end of a phrase
+
+    def emit(node):
+        end = "" in node
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Greedy: the longer phrase is tried first, the one ending here after
+        return f"(?:{body})?" if end else body
+
+    return emit(trie)
+
+
+class SignalMatcher:
+    def __init__(self, tables):
+        friendly = [_fold(p) for p in tables.get("friendly", DEFAULT_TABLES["friendly"])]
+        keywords = tables.get("sentiment_keywords", DEFAULT_TABLES["sentiment_keywords"])
+        priority = tables.get("priority", DEFAULT_TABLES["priority"])
+        self.priority = list(priority) + sorted(set(keywords) - set(priority))
+        rank = {label: i for i, label in enumerate(self.priority)}
+
+        self._payload = {}  # phrase -> (is_friendly, frozenset of sentiment ranks)
+        for phrase in friendly:
+            if phrase:
+                self._payload[phrase] = (True, frozenset())
+        for label, words in keywords.items():
+            for w in words:
+                w = _fold(w)
+                if not w:
+                    continue
+                is_friendly, ranks = self._payload.get(w, (False, frozenset()))
+                self._payload[w] = (is_friendly, ranks | {rank[label]})
+        self.ambiguous = {_fold(w) for w in tables.get("ambiguous", DEFAULT_TABLES["ambiguous"])}
+        self.negators = {_fold(w) for w in tables.get("negators", DEFAULT_TABLES["negators"])}
+        pattern = _trie_pattern(sorted(self._payload))
+        # Lookahead: zero-width, so a match is reported at every start position
+        self._regex = re.compile(rf"(?<!\w)(?=({pattern})(?!\w))") if self._payload else None
+
+    def scan(self, text):
+        friendly = False
+        ranks = set()
+        if self._regex is not None:
+            for m in self._regex.finditer(_fold(text)):
+                is_friendly, phrase_ranks = self._payload[m.group(1)]
+                friendly = friendly or is_friendly
+                ranks.update(phrase_ranks)
+        return Signals(friendly, [self.priority[r] for r in sorted(ranks)])
+
+    def _negated(self, lowered, start):
+        words = _WORD_RE.findall(lowered, max(0, start - 60), start)[-NEGATION_WINDOW:]
+        return any(w in self.negators or w.endswith("n't") for w in words)
+
+    def confident_sentiment(self, text):
+        """The sentiment the keywords name unambiguously, or None.
+
+        None unless every keyword found points at the same sentiment, at
+        least one of them is not in the ambiguous list, and none follows a
+        negator.
+        """
+        if self._regex is None:
+            return None
+        lowered = _fold(text)
+        found, decisive = None, False
+        for m in self._regex.finditer(lowered):
+            phrase = m.group(1)
+            ranks = self._payload[phrase][1]
+            if not ranks:
+                continue
+            if self._negated(lowered, m.start()) or (found is not None and min(ranks) != found):
+                return None
+            found = min(ranks)  # a word listed under several sentiments counts as the strongest
+            decisive = decisive or phrase not in self.ambiguous
+        return self.priority[found] if decisive else None
+
+
+class SignalTables:
+    """The current matcher, rebuilt when the JSON table file changes."""
+
+    def __init__(self, path=None, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self._matcher = SignalMatcher(DEFAULT_TABLES)
+        if path:
+            self.reload()
+
+    def reload(self):
+        """Rebuild from the file now; the old tables stay if it is invalid."""
+        if not self.path:
+            self._matcher = SignalMatcher(DEFAULT_TABLES)
+            return
+        with self._lock:
+            try:
+                self._mtime = os.stat(self.path).st_mtime  # a bad file is retried once it changes
+                with open(self.path, encoding="utf-8") as f:
+                    matcher = SignalMatcher(json.load(f))
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                logger.error(f"Keeping previous signal tables; cannot load {self.path}: {e}")
+                return
+            self._matcher = matcher  # readers see the old or the new matcher, never a mix
+            logger.info(f"Loaded signal tables from {self.path}")
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            changed = os.stat(self.path).st_mtime != self._mtime
+        except OSError:
+            return
+        if changed:
+            self.reload()
+
+    def scan(self, text):
+        if self.path:
+            self._maybe_reload()
+        return self._matcher.scan(text)
+
+    def confident_sentiment(self, text):
+        if self.path:
+            self._maybe_reload()
+        return self._matcher.confident_sentiment(text)
+
+
+_tables = SignalTables()
+
+
+def configure(path=None, check_interval=1.0):
+    """Use the tables in `path` (JSON), watched for changes; None = defaults."""
+    global _tables
+    _tables = SignalTables(path, check_interval)
+
+
+def reload():
+    _tables.reload()
+
+
+def scan(text):
+    return _tables.scan(text)
+
+
+def is_friendly(text):
+    return scan(text).friendly
+
+
+def top_sentiment(text):
+    """Highest-priority sentiment whose keywords appear in `text`, or None."""
+    sentiments = scan(text).sentiments
+    return sentiments[0] if sentiments else None
+
+
+def confident_sentiment(text):
+    """Sentiment the keywords name without negation or ambiguity, or None."""
+    return _tables.confident_sentiment(text)
@@ -0,0 +1,389 @@
+# ai/storage.py
+"""Storage backends for users, chat history and mood history.
+
+`JsonStorage` (default) keeps the original layout: `model/users.json` plus
+append-only per-user logs in `model/chat_histories` / `model/mood_histories`.
+`SqliteStorage` keeps everything in one SQLite database in WAL mode.
+
+Pick one with STORAGE_BACKEND=json|sqlite (SQLITE_PATH for the database
+file). Copy existing JSON data into SQLite with
+
+    python storage.py [--db model/pulsepath.db] migrate
+
+Both backends keep per-user daily/weekly mood rollups up to date on every
+mood append; `rebuild_rollups(username)` recomputes one user's from raw
+history and returns nothing (read them back with `mood_summary`). For all
+users:
+
+    python storage.py rebuild-rollups [--backend json|sqlite]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+import mood_rollups
+from history_log import HistoryLog
+
+HISTORY_KINDS = ("chat", "mood")
+
+
+class JsonStorage:
+    def __init__(self, users_file, chat_dir, mood_dir, rollup_dir=None):
+        self.users_file = users_file
+        self.logs = {"chat": HistoryLog(chat_dir), "mood": HistoryLog(mood_dir)}
+        self.rollup_dir = rollup_dir or os.path.join(os.path.dirname(mood_dir) or ".", "mood_rollups")
+        os.makedirs(self.rollup_dir, exist_ok=True)
+        self._users_lock = threading.Lock()
+
+    # -- users -----------------------------------------------------------
+    def load_users(self):
+        try:
+            with open(self.users_file, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def get_user(self, username):
+        return self.load_users().get(username)
+
+    def add_user(self, username, password):
+        with self._users_lock:
+            users = self.load_users()
+            if username in users:
+                return False
+            users[username] = password
+            tmp = self.users_file + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(users, f)
+            os.replace(tmp, self.users_file)
+            return True
+
+    # -- histories -------------------------------------------------------
+    def append_history(self, kind, username, entries):
+        if kind != "mood":
+            self.logs[kind].append(username, entries)
+            return
+        log = self.logs["mood"]
+        # Rollups are updated under the log's per-user file lock, so appends
+        # from several workers can't lose increments
+        with log.locked(username):
+            before = log.count(username)
+            total = log.append_locked(username, entries)
+            doc = self._load_rollups(username)
+            if doc.get("records") == before:
+                mood_rollups.add_entries(doc, entries)
+                doc["records"] = total
+            else:
+                doc = self._rollups_from_log(username)
+            self._save_rollups(username, doc)
+
+    def load_history(self, kind, username):
+        return self.logs[kind].read_all(username)
+
+    def recent_history(self, kind, username, n):
+        return self.logs[kind].tail(username, n)
+
+    def page_history(self, kind, username, limit, before=None, after=None, since=None, until=None):
+        return self.logs[kind].page(username, limit, before=before, after=after, since=since, until=until)
+
+    def clear_history(self, kind, username):
+        if kind != "mood":
+            self.logs[kind].clear(username)
+            return
+        log = self.logs["mood"]
+        with log.locked(username):
+            log.rewrite_locked(username, [])
+            self._save_rollups(username, {"records": 0})
+
+    # -- mood rollups ----------------------------------------------------
+    # A rollup document records how many log records it covers; one that
+    # disagrees with the log (a crash between the two writes, or a file from
+    # before the count was kept) is rebuilt from the log.
+    def _rollup_path(self, username):
+        return os.path.join(self.rollup_dir, f"{username}.json")
+
+    def _load_rollups(self, username):
+        try:
+            with open(self._rollup_path(username), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_rollups(self, username, doc):
+        tmp = f"{self._rollup_path(username)}.tmp-{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(doc, f)
+        os.replace(tmp, self._rollup_path(username))
+
+    def _rollups_from_log(self, username):
+        doc = {"records": 0}
+        for entry in self.logs["mood"].iter_records(username):
+            mood_rollups.add_entries(doc, [entry])
+            doc["records"] += 1
+        return doc
+
+    def mood_summary(self, username, period, limit):
+        doc = self._load_rollups(username)
+        if doc.get("records", 0) != self.logs["mood"].count(username):
+            doc = self._rebuild(username)
+        return mood_rollups.summarize(doc.get(period, {}), limit)
+
+    def _rebuild(self, username):
+        log = self.logs["mood"]
+        with log.locked(username):
+            doc = self._rollups_from_log(username)
+            self._save_rollups(username, doc)
+        return doc
+
+    def rebuild_rollups(self, username):
+        self._rebuild(username)
+
+    def history_users(self, kind):
+        names = set()
+        for name in os.listdir(self.logs[kind].directory):
+            for ext in (".jsonl", ".json"):
+                if name.endswith(ext):
+                    names.add(name[:-len(ext)])
+        return sorted(names)
+
+
+class SqliteStorage:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS chat_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        entry TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS chat_history_user_ts ON chat_history (username, timestamp);
+    CREATE INDEX IF NOT EXISTS chat_history_user_id ON chat_history (username, id);
+    CREATE TABLE IF NOT EXISTS mood_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        entry TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS mood_history_user_ts ON mood_history (username, timestamp);
+    CREATE INDEX IF NOT EXISTS mood_history_user_id ON mood_history (username, id);
+    CREATE TABLE IF NOT EXISTS mood_rollups (
+        username TEXT NOT NULL,
+        period TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        sentiment TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        confidence_sum REAL NOT NULL,
+        PRIMARY KEY (username, period, bucket, sentiment)
+    );
+    """
+    ROLLUP_UPSERT = (
+        "INSERT INTO mood_rollups (username, period, bucket, sentiment, count, confidence_sum) "
+        "VALUES (?, ?, ?, ?, 1, ?) "
+        "ON CONFLICT (username, period, bucket, sentiment) DO UPDATE SET "
+        "count = count + 1, confidence_sum = confidence_sum + excluded.confidence_sum"
+    )
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections must not be shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _table(kind):
+        if kind not in HISTORY_KINDS:
+            raise ValueError(f"Unknown history kind: {kind!r}")
+        return f"{kind}_history"
+
+    # -- users -----------------------------------------------------------
+    def load_users(self):
+        rows = self._conn().execute("SELECT username, password FROM users").fetchall()
+        return dict(rows)
+
+    def get_user(self, username):
+        row = self._conn().execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def add_user(self, username, password):
+        try:
+            with self._conn() as conn:
+                conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    # -- histories -------------------------------------------------------
+    def append_history(self, kind, username, entries):
+        rows = [(username, int(e.get("timestamp", 0)), json.dumps(e, ensure_ascii=False)) for e in entries]
+        with self._conn() as conn:
+            conn.executemany(
+                f"INSERT INTO {self._table(kind)} (username, timestamp, entry) VALUES (?, ?, ?)", rows
+            )
+            if kind == "mood":
+                conn.executemany(self.ROLLUP_UPSERT, [(username, *d) for d in mood_rollups.deltas(entries)])
+
+    def load_history(self, kind, username):
+        rows = self._conn().execute(
+            f"SELECT entry FROM {self._table(kind)} WHERE username = ? ORDER BY id",
+            (username,),
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def recent_history(self, kind, username, n):
+        rows = self._conn().execute(
+            f"SELECT entry FROM {self._table(kind)} WHERE username = ? "
+            f"ORDER BY id DESC LIMIT ?",
+            (username, n),
+        ).fetchall()
+        return [json.loads(r[0]) for r in reversed(rows)]
+
+    def page_history(self, kind, username, limit, before=None, after=None, since=None, until=None):
+        """Same contract as `HistoryLog.page`; ids are the table's row ids.
+
+        Time bounds are first turned into id bounds through the
+        (username, timestamp) index, then the page is read through the
+        (username, id) index, so deep pages cost the same as the first.
+        """
+        table = self._table(kind)
+        conn = self._conn()
+        lo, hi = after, before  # exclusive id bounds
+        if since is not None:
+            row = conn.execute(
+                f"SELECT id FROM {table} WHERE username = ? AND timestamp >= ? ORDER BY timestamp, id LIMIT 1",
+                (username, since),
+            ).fetchone()
+            if row is None:
+                return [], False
+            lo = max(lo or 0, row[0] - 1)
+        if until is not None:
+            row = conn.execute(
+                f"SELECT id FROM {table} WHERE username = ? AND timestamp >= ? ORDER BY timestamp, id LIMIT 1",
+                (username, until),
+            ).fetchone()
+            if row is not None:
+                hi = row[0] if hi is None else min(hi, row[0])
+        clauses, params = ["username = ?"], [username]
+        if lo is not None:
+            clauses.append("id > ?")
+            params.append(lo)
+        if hi is not None:
+            clauses.append("id < ?")
+            params.append(hi)
+        order = "ASC" if after is not None else "DESC"
+        rows = conn.execute(
+            f"SELECT id, entry FROM {table} WHERE {' AND '.join(clauses)} ORDER BY id {order} LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if order == "DESC":
+            rows.reverse()
+        return [dict(json.loads(entry), id=row_id) for row_id, entry in rows], has_more
+
+    def clear_history(self, kind, username):
+        with self._conn() as conn:
+            conn.execute(f"DELETE FROM {self._table(kind)} WHERE username = ?", (username,))
+            if kind == "mood":
+                conn.execute("DELETE FROM mood_rollups WHERE username = ?", (username,))
+
+    # -- mood rollups ----------------------------------------------------
+    def mood_summary(self, username, period, limit):
+        conn = self._conn()
+        keys = [r[0] for r in conn.execute(
+            "SELECT DISTINCT bucket FROM mood_rollups WHERE username = ? AND period = ? "
+            "ORDER BY bucket DESC LIMIT ?",
+            (username, period, limit),
+        )]
+        if not keys:
+            return []
+        buckets = {}
+        for bucket, sentiment, count, confidence_sum in conn.execute(
+            "SELECT bucket, sentiment, count, confidence_sum FROM mood_rollups "
+            "WHERE username = ? AND period = ? AND bucket >= ?",
+            (username, period, keys[-1]),
+        ):
+            b = buckets.setdefault(bucket, {"count": 0, "confidence_sum": 0.0, "sentiments": {}})
+            b["count"] += count
+            b["confidence_sum"] += confidence_sum
+            b["sentiments"][sentiment] = count
+        return mood_rollups.summarize(buckets, limit)
+
+    def rebuild_rollups(self, username):
+        conn = self._conn()
+        totals = {}
+        for (entry,) in conn.execute("SELECT entry FROM mood_history WHERE username = ? ORDER BY id", (username,)):
+            for *key, confidence in mood_rollups.deltas([json.loads(entry)]):
+                t = totals.setdefault(tuple(key), [0, 0.0])
+                t[0] += 1
+                t[1] += confidence
+        rows = [(username, *key, count, confidence_sum) for key, (count, confidence_sum) in totals.items()]
+        with conn:
+            conn.execute("DELETE FROM mood_rollups WHERE username = ?", (username,))
+            conn.executemany("INSERT INTO mood_rollups VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def history_users(self, kind):
+        rows = self._conn().execute(f"SELECT DISTINCT username FROM {self._table(kind)}").fetchall()
+        return sorted(r[0] for r in rows)
+
+
+def open_storage(backend, users_file, chat_dir, mood_dir, sqlite_path):
+    if backend == "json":
+        return JsonStorage(users_file, chat_dir, mood_dir)
+    if backend == "sqlite":
+        return SqliteStorage(sqlite_path)
+    raise ValueError(f"Unknown storage backend: {backend!r}")
+
+
+def migrate(source, target):
+    """Copy users and histories from `source` into `target`, replacing any
+    history the target already holds for the same users."""
+    counts = {"users": 0, "chat": 0, "mood": 0}
+    for username, password in source.load_users().items():
+        counts["users"] += target.add_user(username, password)
+    for kind in HISTORY_KINDS:
+        for username in source.history_users(kind):
+            entries = source.load_history(kind, username)
+            target.clear_history(kind, username)
+            target.append_history(kind, username, entries)
+            counts[kind] += len(entries)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PulsePath storage tools")
+    parser.add_argument("--db", default=os.environ.get("SQLITE_PATH", "model/pulsepath.db"))
+    parser.add_argument("--users-file", default="model/users.json")
+    parser.add_argument("--chat-dir", default="model/chat_histories")
+    parser.add_argument("--mood-dir", default="model/mood_histories")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="copy the JSON files into SQLite")
+    r = sub.add_parser("rebuild-rollups", help="recompute mood rollups from raw mood history")
+    r.add_argument("--backend", choices=("json", "sqlite"), default=os.environ.get("STORAGE_BACKEND", "json"))
+    args = parser.parse_args()
+
+    json_store = JsonStorage(args.users_file, args.chat_dir, args.mood_dir)
+    if args.command == "migrate":
+        counts = migrate(json_store, SqliteStorage(args.db))
+        print(f"✓ migrated {counts['users']} users, {counts['chat']} chat and "
+              f"{counts['mood']} mood entries into {args.db}")
+    else:
+        target = json_store if args.backend == "json" else SqliteStorage(args.db)
+        users = target.history_users("mood")
+        for username in users:
+            target.rebuild_rollups(username)
+        print(f"✓ rebuilt mood rollups for {len(users)} users")
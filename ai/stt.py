@@ -0,0 +1,262 @@
+# ai/stt.py
+"""Speech-to-text helpers around Vosk.
+
+`transcribe_wav` decodes a complete WAV clip held in memory. `SttWorkerPool`
+runs the same decode in worker processes that each load the Vosk model
+once. Streaming sessions accept raw 16-bit mono PCM chunks as the client
+records them and return partial results after every chunk, so the
+transcript is ready as soon as the last chunk arrives.
+"""
+import io
+import json
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from vosk import KaldiRecognizer
+
+from prefork import fork_context, fork_workers
+
+
+def _decode(rec, wf, chunk_frames):
+    transcript = ""
+    while True:
+        data = wf.readframes(chunk_frames)
+        if len(data) == 0:
+            break
+        if rec.AcceptWaveform(data):
+            transcript += rec.Result()
+    # FinalResult also resets the recognizer, so it can be reused
+    transcript += rec.FinalResult()
+    return transcript
+
+
+def transcribe_wav(model, wav_bytes, chunk_frames=4000):
+    """Decode a WAV clip; returns the concatenated Vosk result JSON strings
+    (the format /stt has always returned)."""
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+        rec = KaldiRecognizer(model, wf.getframerate())
+        rec.SetWords(True)
+        return _decode(rec, wf, chunk_frames)
+
+
+# -- worker process side ------------------------------------------------
+_worker_model = None
+_worker_recognizers = {}  # sample rate -> KaldiRecognizer
+
+
+def _init_worker(model_path):
+    global _worker_model
+    from vosk import Model
+    _worker_model = Model(model_path)
+
+
+def _ping():
+    return _worker_model is not None
+
+
+def _decode_job(wav_bytes, chunk_frames=4000):
+    start = time.perf_counter()
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+        rate = wf.getframerate()
+        audio_seconds = wf.getnframes() / float(rate)
+        rec = _worker_recognizers.get(rate)
+        if rec is None:
+            rec = _worker_recognizers[rate] = KaldiRecognizer(_worker_model, rate)
+            rec.SetWords(True)
+        try:
+            transcript = _decode(rec, wf, chunk_frames)
+        except Exception:
+            _worker_recognizers.pop(rate, None)  # state unknown; rebuild next time
+            raise
+    return transcript, audio_seconds, time.perf_counter() - start
+
+
+class SttBusy(Exception):
+    pass
+
+
+class SttWorkerPool:
+    """Process pool for Vosk decoding.
+
+    At most `workers + max_queue` clips are admitted at once; beyond that
+    `transcribe` raises `SttBusy` straight away instead of queueing. Each
+    clip must finish within `timeout` seconds or `TimeoutError` is raised.
+
+    Every worker is forked in the constructor, before the executor has any
+    thread, so create the pool before the app starts background threads and
+    before anything is submitted to another pool; `start` then loads the
+    models.
+    """
+
+    def __init__(self, model_path, workers, max_queue=8, timeout=30.0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=fork_context(),
+            initializer=_init_worker,
+            initargs=(model_path,),
+        )
+        fork_workers(self._executor)
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._ready = []
+        self._metrics = {"jobs": 0, "rejected": 0, "timeouts": 0, "failures": 0,
+                         "audio_seconds": 0.0, "decode_seconds": 0.0, "rtf_max": 0.0}
+
+    def start(self):
+        self._ready = [self._executor.submit(_ping) for _ in range(self.workers)]
+        return self
+
+    def wait_ready(self, timeout=None):
+        for f in self._ready:
+            f.result(timeout=timeout)
+        return self
+
+    def _done(self, _future):
+        with self._lock:
+            self._inflight -= 1
+        self._slots.release()
+
+    def transcribe(self, wav_bytes):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._metrics["rejected"] += 1
+            raise SttBusy("STT queue is full")
+        with self._lock:
+            self._inflight += 1
+        future = self._executor.submit(_decode_job, wav_bytes)
+        future.add_done_callback(self._done)
+        try:
+            transcript, audio_seconds, decode_seconds = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self._metrics["timeouts"] += 1
+            raise TimeoutError(f"STT decode exceeded {self.timeout:.0f}s")
+        except Exception:
+            with self._lock:
+                self._metrics["failures"] += 1
+            raise
+        with self._lock:
+            m = self._metrics
+            m["jobs"] += 1
+            m["audio_seconds"] += audio_seconds
+            m["decode_seconds"] += decode_seconds
+            if audio_seconds:
+                m["rtf_max"] = max(m["rtf_max"], decode_seconds / audio_seconds)
+        return transcript
+
+    def stats(self):
+        with self._lock:
+            m = dict(self._metrics)
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "inflight": self._inflight,
+                "queue_depth": max(0, self._inflight - self.workers),
+                "jobs": m["jobs"],
+                "rejected": m["rejected"],
+                "timeouts": m["timeouts"],
+                "failures": m["failures"],
+                "audio_seconds": round(m["audio_seconds"], 3),
+                "rtf_mean": m["decode_seconds"] / m["audio_seconds"] if m["audio_seconds"] else 0.0,
+                "rtf_max": m["rtf_max"],
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class StreamingSession:
+    def __init__(self, model, sample_rate, owner):
+        self.owner = owner
+        self.sample_rate = sample_rate
+        self.recognizer = KaldiRecognizer(model, sample_rate)
+        self.segments = []
+        self.lock = threading.Lock()
+        self.last_active = time.monotonic()
+
+    def feed(self, pcm):
+        """Push one PCM chunk straight into the recognizer."""
+        with self.lock:
+            self.last_active = time.monotonic()
+            if self.recognizer.AcceptWaveform(pcm):
+                text = json.loads(self.recognizer.Result()).get("text", "")
+                if text:
+                    self.segments.append(text)
+                partial = ""
+            else:
+                partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+            return {"text": " ".join(self.segments), "partial": partial, "final": False}
+
+    def finish(self):
+        with self.lock:
+            text = json.loads(self.recognizer.FinalResult()).get("text", "")
+            if text:
+                self.segments.append(text)
+            return {"text": " ".join(self.segments), "partial": "", "final": True}
+
+
+class StreamingSessions:
+    """In-process registry of open streaming sessions.
+
+    Sessions hold recognizer state, so a client must keep talking to the
+    same worker; idle sessions are dropped after `idle_timeout` seconds, on
+    every lookup and by a sweeper thread started with the first session.
+    """
+
+    def __init__(self, idle_timeout=60, max_sessions=200):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for sid in [sid for sid, s in self._sessions.items() if s.last_active < cutoff]:
+            del self._sessions[sid]
+
+    def _sweep(self):
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 4))
+            with self._lock:
+                self._expire()
+
+    def create(self, model, sample_rate, owner):
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                raise OverflowError("Too many open streaming sessions")
+            if self._sweeper is None:
+                # Started lazily so it never exists before worker pools fork
+                self._sweeper = threading.Thread(target=self._sweep, name="stt-session-sweeper", daemon=True)
+                self._sweeper.start()
+            sid = uuid.uuid4().hex
+            self._sessions[sid] = StreamingSession(model, sample_rate, owner)
+            return sid
+
+    def get(self, sid, owner):
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(sid)
+        if session is None or session.owner != owner:
+            raise KeyError(sid)
+        return session
+
+    def pop(self, sid, owner):
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(sid)
+            if session is None or session.owner != owner:
+                raise KeyError(sid)
+            return self._sessions.pop(sid)
+
+    def __len__(self):
+        return len(self._sessions)
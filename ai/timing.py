@@ -0,0 +1,86 @@
+# ai/timing.py
+"""Per-request stage timings.
+
+`StageTimer` records how long each stage of one request took (stages may
+overlap when they run concurrently) and renders them as a Server-Timing
+header, so the browser devtools show the breakdown. `StageMetrics`
+aggregates them across requests for /metrics.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}  # name -> seconds
+        self.marks = {}   # name -> seconds since the start (e.g. first byte)
+        self.notes = {}   # name -> description
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = time.perf_counter() - start
+
+    def timed(self, name, fn, *args):
+        """`fn(*args)`, timed as stage `name`; for submitting to executors."""
+        with self.stage(name):
+            return fn(*args)
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter() - self.start
+
+    def note(self, name, description):
+        self.notes[name] = description
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def header(self):
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in {**self.stages, **self.marks}.items()]
+        parts.append(f"total;dur={self.total() * 1000:.1f}")
+        parts += [f'{name};desc="{desc}"' for name, desc in self.notes.items()]
+        return ", ".join(parts)
+
+
+class StageMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._stages = {}  # name -> [count, seconds, max]
+        self._total = 0.0
+        self._serial = 0.0  # sum of stage times: the latency if run back to back
+        self._notes = {}   # "name=desc" -> count
+
+    def record(self, timer):
+        total = timer.total()
+        with self._lock:
+            self._requests += 1
+            self._total += total
+            self._serial += sum(timer.stages.values())
+            for name, seconds in {**timer.stages, **timer.marks}.items():
+                s = self._stages.setdefault(name, [0, 0.0, 0.0])
+                s[0] += 1
+                s[1] += seconds
+                s[2] = max(s[2], seconds)
+            for name, desc in timer.notes.items():
+                key = f"{name}={desc}"
+                self._notes[key] = self._notes.get(key, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            n = self._requests
+            return {
+                "requests": n,
+                "total_ms_mean": 1000.0 * self._total / n if n else 0.0,
+                "serial_ms_mean": 1000.0 * self._serial / n if n else 0.0,
+                "stages": {
+                    name: {"count": c, "ms_mean": 1000.0 * t / c, "ms_max": 1000.0 * m}
+                    for name, (c, t, m) in self._stages.items()
+                },
+                "notes": dict(self._notes),
+            }
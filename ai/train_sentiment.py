@@ -1,36 +1,342 @@
 # ai/train_sentiment.py
-import pandas as pd, joblib, tensorflow as tf
+"""Train the Bi-LSTM sentiment model on a CSV of text,label rows.
+
+The corpus is streamed: it is read in chunks, cleaned and tokenized in a
+process pool and fed to `model.fit` through tf.data, so peak memory depends
+on the chunk size and shuffle buffer, not on the corpus size. Rows are
+assigned to the validation split by a hash of their text, which is stable
+across epochs and runs.
+
+Training chunks are read in a fresh random order every epoch and their rows
+shuffled within --shuffle-buffer, so the shuffle is only as good as that
+buffer: a row mixes with the rows of the few chunks around it, not with the
+whole corpus. A CSV sorted by label wants a buffer spanning several chunks
+(or a pre-shuffled CSV).
+
+The encoded corpus (padded int32 sequences + label ids, with the fitted
+tokenizer and label encoder) is cached as memory-mapped .npy files under
+--cache-dir, keyed by the CSV contents, the clean() version and the
+tokenizer settings; a rerun with only new hyperparameters starts training
+straight from it. --no-cache re-encodes the CSV on the fly every epoch.
+
+    python train_sentiment.py [--csv combined.csv] [--epochs 6] [--no-cache]
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+import tensorflow as tf
 from sklearn.preprocessing import LabelEncoder
 from tensorflow.keras.preprocessing.text import Tokenizer
-from tensorflow.keras.preprocessing.sequence import pad_sequences
-from preprocess import clean                       # <── import the helper
-
-# 1. load + clean
-df = pd.read_csv("combined.csv")                   # CSV with 2 cols: text,label
-df["text"] = df["text"].apply(clean)
-
-df.rename(columns={"target": "label"}, inplace=True)
-
-# 2. tokenize
-tok = Tokenizer(num_words=12000, oov_token="<UNK>")
-tok.fit_on_texts(df.text)
-X = pad_sequences(tok.texts_to_sequences(df.text), maxlen=120)
-
-# 3. label-encode
-enc = LabelEncoder().fit(df.label)                 # labels: happy / sad / neutral
-y  = tf.keras.utils.to_categorical(enc.transform(df.label))
-
-# 4. simple Bi-LSTM
-model = tf.keras.Sequential([
-    tf.keras.layers.Embedding(12000, 128, input_length=120),
-    tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(64)),
-    tf.keras.layers.Dense(3, activation="softmax")
-])
-model.compile("adam", "categorical_crossentropy", metrics=["accuracy"])
-model.fit(X, y, epochs=6, batch_size=64, validation_split=0.1)
-
-# 5. save artefacts
-model.save("model/sentiment.h5")
-joblib.dump(tok, "model/tokenizer.joblib")
-joblib.dump(enc, "model/label_encoder.joblib")
-print("✓ trained & saved to ai/model/")
+
+from numpy.lib.format import open_memmap
+
+from preprocess import CLEAN_VERSION, clean_batch   # <── import the helper
+from corpus_cache import CorpusCache
+from fast_tokenizer import FastTokenizer, check_parity as check_tokenizer_parity
+from inference import MAXLEN, KerasSentimentModel, TFLiteSentimentModel, export_tflite, check_parity
+
+NUM_WORDS = 12000
+OOV_TOKEN = "<UNK>"
+PARITY_MIN_AGREEMENT = 0.99
+
+
+# -- corpus streaming -----------------------------------------------------
+def _columns(df):
+    df = df.rename(columns={"target": "label"})
+    return df["text"].astype(str).tolist(), df["label"].astype(str).tolist()
+
+
+def read_chunks(path, chunksize):
+    """(texts, labels) lists, `chunksize` rows at a time."""
+    for df in pd.read_csv(path, chunksize=chunksize):
+        yield _columns(df)
+
+
+def chunk_spans(path, chunksize):
+    """The CSV header line and the byte range of every `chunksize` rows after it.
+
+    A line with an odd number of quotes opens (or closes) a quoted field, so
+    rows with embedded newlines are kept whole.
+    """
+    spans = []
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = pos = len(header)
+        rows, quoted = 0, False
+        for line in f:
+            pos += len(line)
+            quoted ^= line.count(b'"') % 2 == 1
+            if not quoted:
+                rows += 1
+                if rows == chunksize:
+                    spans.append((start, pos))
+                    start, rows = pos, 0
+        if pos > start:
+            spans.append((start, pos))
+    return header, spans
+
+
+def read_chunks_shuffled(path, layout):
+    """read_chunks over the spans of `layout` (from chunk_spans), in a fresh
+    random order on every call."""
+    header, spans = layout
+    with open(path, "rb") as f:
+        for i in np.random.permutation(len(spans)):
+            start, end = spans[i]
+            f.seek(start)
+            yield _columns(pd.read_csv(io.BytesIO(header + f.read(end - start))))
+
+
+def is_validation(text, val_percent):
+    return zlib.crc32(text.encode("utf-8")) % 100 < val_percent
+
+
+_worker_tok = None
+_worker_enc = None
+
+
+def _init_worker(tok, enc):
+    global _worker_tok, _worker_enc
+    # Same ids as tok.texts_to_sequences, written straight into the padded array
+    _worker_tok, _worker_enc = FastTokenizer.from_keras(tok), enc
+
+
+def _ready():
+    return True
+
+
+def _encode_chunk(texts, labels, split, val_percent):
+    """(padded int32 sequences, int32 label ids, is-validation mask) for the
+    rows of `split` ("train", "val", or None for both)."""
+    is_val = np.array([is_validation(t, val_percent) for t in texts], dtype=bool)
+    if split is not None:
+        keep = is_val if split == "val" else ~is_val
+        texts = [t for t, k in zip(texts, keep) if k]
+        labels = [l for l, k in zip(labels, keep) if k]
+        is_val = is_val[keep]
+    x = _worker_tok.encode_batch(clean_batch(texts, workers=1), maxlen=MAXLEN)
+    y = _worker_enc.transform(labels).astype(np.int32)
+    return x, y, is_val
+
+
+def pipelined(pool, fn, jobs, inflight):
+    """fn(*job) for each job, in order, with at most `inflight` running."""
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.submit(fn, *job))
+        if len(pending) >= inflight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def fork_pool(workers, initializer=None, initargs=()):
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=initializer,
+        initargs=initargs,
+    )
+    for f in [pool.submit(_ready) for _ in range(workers)]:
+        f.result()  # fork every worker now, before TensorFlow starts threads
+    return pool
+
+
+def encoded_chunks(pool, args, split, layout=None):
+    """Encoded (x, y) chunks of `split`; in random chunk order when given the
+    CSV's `layout`."""
+    chunks = read_chunks_shuffled(args.csv, layout) if layout else read_chunks(args.csv, args.chunksize)
+    jobs = ((texts, labels, split, args.val_percent) for texts, labels in chunks)
+    for x, y, _ in pipelined(pool, _encode_chunk, jobs, args.inflight):
+        yield x, y
+
+
+def array_chunks(x, y, chunksize, shuffle=False):
+    # Slices of the memmaps; pages are read as tf.data consumes them. Shuffled,
+    # the slices come in a fresh random order every epoch
+    starts = np.arange(0, len(x), chunksize)
+    if shuffle:
+        starts = np.random.permutation(starts)
+    for i in starts:
+        yield x[i:i + chunksize], y[i:i + chunksize]
+
+
+def take_rows(ds, n):
+    """Up to `n` rows of x from `ds`, or None if it has none."""
+    sample, rows = [], 0
+    for x, _ in ds:
+        sample.append(x.numpy())
+        rows += len(sample[-1])
+        if rows >= n:
+            break
+    return np.concatenate(sample)[:n] if sample else None
+
+
+def make_dataset(chunks, args, shuffle):
+    """`chunks()` yields (x, y) blocks; tf.data batches them for fit()."""
+    ds = tf.data.Dataset.from_generator(
+        chunks,
+        output_signature=(tf.TensorSpec((None, MAXLEN), tf.int32), tf.TensorSpec((None,), tf.int32)),
+    ).unbatch()
+    if shuffle:
+        ds = ds.shuffle(args.shuffle_buffer)
+    return ds.batch(args.batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+# -- training -------------------------------------------------------------
+def fit_vocabulary(args):
+    """First pass: fit the tokenizer incrementally, collect the labels and
+    count the rows of each split."""
+    tok = Tokenizer(num_words=NUM_WORDS, oov_token=OOV_TOKEN)
+    labels = set()
+    counts = {"train": 0, "val": 0}
+
+    def jobs():
+        for texts, chunk_labels in read_chunks(args.csv, args.chunksize):
+            labels.update(chunk_labels)
+            val = sum(is_validation(t, args.val_percent) for t in texts)
+            counts["val"] += val
+            counts["train"] += len(texts) - val
+            yield texts, 1  # clean_batch(texts, workers=1) in a pool worker
+
+    pool = fork_pool(args.workers)
+    for cleaned in pipelined(pool, clean_batch, jobs(), args.inflight):
+        tok.fit_on_texts(cleaned)
+    pool.shutdown()
+    enc = LabelEncoder().fit(sorted(labels))        # labels: happy / sad / neutral
+    return tok, enc, counts
+
+
+def build_model(num_classes):
+    model = tf.keras.Sequential([
+        tf.keras.layers.Embedding(NUM_WORDS, 128, input_length=MAXLEN),
+        tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(64)),
+        tf.keras.layers.Dense(num_classes, activation="softmax")
+    ])
+    # Sparse labels: the same loss as one-hot categorical, without the copy
+    model.compile("adam", "sparse_categorical_crossentropy", metrics=["accuracy"])
+    return model
+
+
+def build_cache_entry(directory, args):
+    """Encode the whole CSV once into memory-mapped arrays in `directory`."""
+    tok, enc, counts = fit_vocabulary(args)
+    joblib.dump(tok, os.path.join(directory, "tokenizer.joblib"))
+    joblib.dump(enc, os.path.join(directory, "label_encoder.joblib"))
+    arrays = {}
+    for split, n in counts.items():
+        arrays[f"x_{split}"] = open_memmap(os.path.join(directory, f"x_{split}.npy"), "w+", np.int32, (n, MAXLEN))
+        arrays[f"y_{split}"] = open_memmap(os.path.join(directory, f"y_{split}.npy"), "w+", np.int32, (n,))
+
+    pool = fork_pool(args.workers, _init_worker, (tok, enc))
+    offsets = {"train": 0, "val": 0}
+    jobs = ((texts, labels, None, args.val_percent) for texts, labels in read_chunks(args.csv, args.chunksize))
+    for x, y, is_val in pipelined(pool, _encode_chunk, jobs, args.inflight):
+        for split, mask in (("train", ~is_val), ("val", is_val)):
+            start, n = offsets[split], int(mask.sum())
+            arrays[f"x_{split}"][start:start + n] = x[mask]
+            arrays[f"y_{split}"][start:start + n] = y[mask]
+            offsets[split] += n
+    pool.shutdown()
+    for a in arrays.values():
+        a.flush()
+
+
+def main(args):
+    pool = None
+    if args.no_cache:
+        # 1. vocabulary + labels (streamed)
+        tok, enc, _ = fit_vocabulary(args)
+        # 2. encoding workers, each holding the tokenizer + label encoder
+        pool = fork_pool(args.workers, _init_worker, (tok, enc))
+        # 3. streaming datasets, re-encoded every epoch; training chunks in
+        #    a new order each time
+        layout = chunk_spans(args.csv, args.chunksize)
+        train_ds = make_dataset(lambda: encoded_chunks(pool, args, "train", layout), args, shuffle=True)
+        val_ds = make_dataset(lambda: encoded_chunks(pool, args, "val"), args, shuffle=False)
+    else:
+        # 1-2. encoded corpus from the cache, built on a miss
+        cache = CorpusCache(args.cache_dir, max_bytes=int(args.cache_max_gb * 1024 ** 3))
+        key = cache.key(args.csv, {
+            "clean_version": CLEAN_VERSION, "num_words": NUM_WORDS, "oov_token": OOV_TOKEN,
+            "maxlen": MAXLEN, "val_percent": args.val_percent,
+        })
+        entry = cache.lookup(key)
+        if entry is None:
+            with cache.build(key) as directory:
+                build_cache_entry(directory, args)
+            entry = cache.lookup(key)
+            print(f"✓ encoded corpus cached in {entry}")
+        else:
+            print(f"✓ using cached corpus {entry}")
+        tok = joblib.load(os.path.join(entry, "tokenizer.joblib"))
+        enc = joblib.load(os.path.join(entry, "label_encoder.joblib"))
+        x_train, y_train, x_val, y_val = (np.load(os.path.join(entry, f"{name}.npy"), mmap_mode="r")
+                                          for name in ("x_train", "y_train", "x_val", "y_val"))
+        # 3. datasets over the memory-mapped arrays
+        train_ds = make_dataset(lambda: array_chunks(x_train, y_train, args.chunksize, shuffle=True),
+                                args, shuffle=True)
+        val_ds = make_dataset(lambda: array_chunks(x_val, y_val, args.chunksize), args, shuffle=False)
+
+    # 4. simple Bi-LSTM
+    model = build_model(len(enc.classes_))
+    model.fit(train_ds, validation_data=val_ds, epochs=args.epochs)
+
+    # 5. save artefacts
+    os.makedirs("model", exist_ok=True)
+    model.save("model/sentiment.h5")
+    joblib.dump(tok, "model/tokenizer.joblib")
+    joblib.dump(enc, "model/label_encoder.joblib")
+    print("✓ trained & saved to ai/model/")
+
+    # 5b. compact tokenizer for serving, checked against the Keras one
+    FastTokenizer.from_keras(tok).save("model/tokenizer.json")
+    texts, _ = next(read_chunks(args.csv, 5000))
+    report = check_tokenizer_parity(tok, FastTokenizer.load("model/tokenizer.json"), clean_batch(texts, workers=1))
+    print(f"model/tokenizer.json: {report}")
+    if report["mismatches"]:
+        raise SystemExit(f"✗ model/tokenizer.json encodes {report['first_mismatch']!r} differently")
+
+    # 6. export TFLite runtimes (float + int8 weights) and prove label parity
+    sample = take_rows(val_ds, 5000)
+    if sample is None:  # --val-percent 0
+        sample = take_rows(train_ds, 5000)
+    if pool is not None:
+        pool.shutdown()
+    reference = KerasSentimentModel(model)
+    for path, quantize in (("model/sentiment.tflite", False), ("model/sentiment.int8.tflite", True)):
+        export_tflite(model, path, maxlen=MAXLEN, quantize=quantize)
+        report = check_parity(reference, TFLiteSentimentModel(path), sample)
+        print(f"{path}: {report}")
+        if report["label_agreement"] < PARITY_MIN_AGREEMENT:
+            raise SystemExit(f"✗ {path} disagrees with the Keras model on "
+                             f"{1 - report['label_agreement']:.2%} of samples")
+    print("✓ exported TFLite artefacts")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="combined.csv", help="CSV with 2 cols: text,label (or target)")
+    parser.add_argument("--epochs", type=int, default=6)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--val-percent", type=int, default=10)
+    parser.add_argument("--chunksize", type=int, default=20000, help="CSV rows read and encoded at a time")
+    parser.add_argument("--inflight", type=int, default=None, help="chunks being encoded at once (default: workers + 1)")
+    parser.add_argument("--shuffle-buffer", type=int, default=50000,
+                        help="rows shuffled together; chunks also come in random order each epoch, but a row "
+                             "only mixes with rows this close to it, so keep it several chunks long")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cache-dir", default="model/corpus_cache")
+    parser.add_argument("--cache-max-gb", type=float, default=20.0, help="oldest cached corpora are removed beyond this")
+    parser.add_argument("--no-cache", action="store_true", help="re-encode the CSV every epoch instead")
+    args = parser.parse_args()
+    args.inflight = args.inflight or args.workers + 1
+    main(args)
@@ -1,34 +1,97 @@
 import pyttsx3
-import io
-import wave
-import struct
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-def synthesize(text: str) -> bytes:
-    # Initialize the TTS engine
+from prefork import fork_context, fork_workers
+
+logger = logging.getLogger(__name__)
+
+# Voice settings; also part of the cache key for rendered audio
+RATE = 150      # Speed of speech
+VOLUME = 0.9    # Volume (0.0 to 1.0)
+
+# Prefer tmpfs so the intermediate WAV never touches disk
+TMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+_engine = None
+_pool = None
+# Without the pool, one thread owns the engine (it is not thread-safe) and
+# renders requests in the order they arrive
+_local = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+
+
+def _init_engine():
+    """Initialise the TTS engine once per process with the voice already chosen."""
+    global _engine
     engine = pyttsx3.init()
-    
-    # Set properties (optional)
-    engine.setProperty('rate', 150)    # Speed of speech
-    engine.setProperty('volume', 0.9)  # Volume (0.0 to 1.0)
-    
+    engine.setProperty('rate', RATE)
+    engine.setProperty('volume', VOLUME)
+
     # Get available voices and set a female voice if available
-    voices = engine.getProperty('voices')
-    for voice in voices:
+    for voice in engine.getProperty('voices'):
         if 'female' in voice.name.lower():
             engine.setProperty('voice', voice.id)
             break
-    
-    # Create a temporary file to store the audio
-    temp_file = "temp_audio.wav"
-    engine.save_to_file(text, temp_file)
-    engine.runAndWait()
-    
-    # Read the generated WAV file
-    with open(temp_file, 'rb') as f:
-        audio_data = f.read()
-    
-    # Clean up the temporary file
-    import os
-    os.remove(temp_file)
-    
-    return audio_data
+    _engine = engine
+
+
+def _render(text: str) -> bytes:
+    if _engine is None:
+        _init_engine()
+    # Unique file per call so concurrent syntheses never share a path
+    fd, path = tempfile.mkstemp(prefix="tts-", suffix=".wav", dir=TMP_DIR)
+    os.close(fd)
+    try:
+        _engine.save_to_file(text, path)
+        _engine.runAndWait()
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def _ready() -> bool:
+    return _engine is not None
+
+
+def create_pool(workers: int):
+    """Fork `workers` render processes; nothing is submitted yet.
+
+    Call before the app starts other threads and before any pool is
+    submitted to (see prefork.py); `start_pool` then readies the engines.
+    Without fork (Windows) speech stays in-process.
+    """
+    global _pool
+    context = fork_context()
+    if context is None:
+        logger.warning("TTS worker processes need the fork start method; rendering in-process")
+        return None
+    _pool = fork_workers(ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_engine,
+    ))
+    return _pool
+
+
+def start_pool(workers: int):
+    """Wait for every worker's engine; on failure (no TTS backend, ...) the
+    pool is dropped and speech renders in-process instead."""
+    global _pool
+    if _pool is None:
+        return None
+    try:
+        for f in [_pool.submit(_ready) for _ in range(workers)]:
+            f.result()
+    except Exception as e:
+        logger.warning(f"TTS worker pool failed to start, rendering in-process: {e!r}")
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    return _pool
+
+
+def synthesize(text: str, timeout: float = 60.0) -> bytes:
+    executor = _pool if _pool is not None else _local
+    return executor.submit(_render, text).result(timeout=timeout)
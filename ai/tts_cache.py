@@ -0,0 +1,159 @@
+# ai/tts_cache.py
+"""Content-addressed cache of rendered speech.
+
+Audio is stored on disk under a SHA-256 of the voice settings, output
+format and text; an in-memory LRU index tracks size and recency so the
+directory stays under `max_bytes`. Callers get a file path back, which
+Flask can hand to the WSGI server with `send_file` (sendfile, no copy
+through Python).
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TtsCache:
+    def __init__(self, directory, voice_settings, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.voice_settings = voice_settings
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._index = OrderedDict()  # key -> size, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}          # key -> Event, so one text is rendered once
+        self._metrics = {"hits": 0, "misses": 0, "evictions": 0}
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.directory, name)
+            st = os.stat(path)
+            entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._bytes += size
+        self._evict()
+
+    def key(self, text, fmt="wav"):
+        digest = hashlib.sha256(f"{self.voice_settings}\0{fmt}\0{text}".encode("utf-8")).hexdigest()
+        return f"{digest}.{fmt}"
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        path = self.path(key)
+        try:
+            os.utime(path)  # keeps LRU order across restarts
+        except FileNotFoundError:
+            with self._lock:
+                self._bytes -= self._index.pop(key, 0)
+            return None
+        return path
+
+    def put(self, key, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.path(key))
+        with self._lock:
+            self._bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict()
+        return self.path(key)
+
+    def _evict(self):
+        # Caller holds the lock (or is __init__)
+        while self._bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self._metrics["evictions"] += 1
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def get_or_render(self, text, render, fmt="wav"):
+        """Path to the cached audio for `text`, rendering it on a miss."""
+        key = self.key(text, fmt)
+        while True:
+            path = self.get(key)
+            if path is not None:
+                with self._lock:
+                    self._metrics["hits"] += 1
+                return path
+            with self._lock:
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    owner = True
+                else:
+                    owner = False
+            if not owner:
+                event.wait()
+                continue  # rendered by another request (or it failed; retry)
+            try:
+                with self._lock:
+                    self._metrics["misses"] += 1
+                return self.put(key, render(text))
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                event.set()
+
+    def use(self, text, render, use, fmt="wav", attempts=3):
+        """`use(path)` on the cached audio for `text`.
+
+        Another request can evict the file between the lookup and `use`
+        opening it; that FileNotFoundError renders the text again.
+        """
+        for attempt in range(attempts):
+            try:
+                return use(self.get_or_render(text, render, fmt))
+            except FileNotFoundError:
+                if attempt == attempts - 1:
+                    raise
+                logger.info(f"Cached TTS audio evicted while in use; rendering {text[:40]!r} again")
+
+    def prerender(self, texts, render, fmt="wav"):
+        """Render any of `texts` not cached yet in a background thread."""
+        def run():
+            start, rendered = time.perf_counter(), 0
+            for text in texts:
+                if self.get(self.key(text, fmt)) is not None:
+                    continue
+                try:
+                    self.get_or_render(text, render, fmt)
+                    rendered += 1
+                except Exception as e:
+                    logger.error(f"Pre-rendering TTS failed for {text[:40]!r}: {e}")
+            logger.info(f"Pre-rendered {rendered} TTS responses in {time.perf_counter() - start:.1f}s")
+
+        thread = threading.Thread(target=run, name="tts-prerender", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            lookups = self._metrics["hits"] + self._metrics["misses"]
+            return {
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": self._metrics["hits"] / lookups if lookups else 0.0,
+                **self._metrics,
+            }
@@ -0,0 +1,101 @@
+# ai/tts_formats.py
+"""Compressed output formats for synthesized speech.
+
+The TTS engine produces PCM WAV; `AudioEncoder` re-encodes it to FLAC,
+OGG/Vorbis or OGG/Opus with soundfile (libsndfile) on a small thread
+pool, so encoding never runs more than `workers` at a time. Opus only
+accepts a handful of sample rates, so audio is resampled up to the
+nearest one first.
+"""
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import soundfile as sf
+
+from audio import read_wav, resample
+
+# format -> (mimetype, soundfile format, soundfile subtype)
+FORMATS = {
+    "wav": ("audio/wav", None, None),
+    "flac": ("audio/flac", "FLAC", "PCM_16"),
+    "ogg": ("audio/ogg", "OGG", "VORBIS"),
+    "opus": ("audio/ogg; codecs=opus", "OGG", "OPUS"),
+}
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+# Concrete media types a client can ask for; wildcards always get WAV
+ACCEPT_TYPES = {
+    "audio/wav": "wav", "audio/x-wav": "wav", "audio/wave": "wav",
+    "audio/flac": "flac", "audio/ogg": "ogg", "audio/opus": "opus",
+}
+
+
+def negotiate(requested, accept):
+    """Pick an output format from a `format` parameter or an Accept header.
+
+    `accept` is a werkzeug MIMEAccept. Returns None when `requested` names
+    an unknown format. A compressed format is only picked when the client
+    names its media type; `*/*`, `audio/*` and ties fall back to WAV, which
+    every player handles.
+    """
+    if requested:
+        requested = requested.lower()
+        return requested if requested in FORMATS else None
+    best, best_q = "wav", 0
+    for value, q in accept or ():
+        mime, _, params = value.lower().partition(";")
+        fmt = ACCEPT_TYPES.get(mime.strip())
+        if fmt == "ogg" and "opus" in params:
+            fmt = "opus"  # audio/ogg; codecs=opus
+        if fmt and (q > best_q or (q == best_q and fmt == "wav")):
+            best, best_q = fmt, q
+    return best
+
+
+def encode(wav_bytes, fmt):
+    if fmt == "wav":
+        return wav_bytes
+    _, sf_format, subtype = FORMATS[fmt]
+    x, rate = read_wav(wav_bytes)
+    if fmt == "opus" and rate not in OPUS_RATES:
+        target = next((r for r in OPUS_RATES if r >= rate), OPUS_RATES[-1])
+        x, rate = resample(x, rate, target), target
+    buf = io.BytesIO()
+    sf.write(buf, x, rate, format=sf_format, subtype=subtype)
+    return buf.getvalue()
+
+
+class AudioEncoder:
+    def __init__(self, workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts-encode")
+        self._lock = threading.Lock()
+        self._metrics = {}  # fmt -> {"count", "seconds", "in_bytes", "out_bytes"}
+
+    def _timed(self, wav_bytes, fmt):
+        start = time.perf_counter()
+        data = encode(wav_bytes, fmt)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            m = self._metrics.setdefault(fmt, {"count": 0, "seconds": 0.0, "in_bytes": 0, "out_bytes": 0})
+            m["count"] += 1
+            m["seconds"] += elapsed
+            m["in_bytes"] += len(wav_bytes)
+            m["out_bytes"] += len(data)
+        return data
+
+    def encode(self, wav_bytes, fmt, timeout=30.0):
+        return self._executor.submit(self._timed, wav_bytes, fmt).result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                fmt: {
+                    "count": m["count"],
+                    "encode_ms_mean": 1000.0 * m["seconds"] / m["count"],
+                    "compression_ratio": m["in_bytes"] / m["out_bytes"] if m["out_bytes"] else 0.0,
+                }
+                for fmt, m in self._metrics.items()
+            }
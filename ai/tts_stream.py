@@ -0,0 +1,123 @@
+# ai/tts_stream.py
+"""Sentence-level streaming speech.
+
+The reply is split into sentences; every sentence is submitted for
+rendering at once and the audio is sent back in order as each one is
+ready, as a single WAV stream (open-ended header followed by PCM). The
+first segment is cut at a clause boundary when needed so it can be
+rendered within the first-chunk budget; its length is derived from the
+observed rendering speed.
+"""
+import io
+import logging
+import re
+import struct
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n+")
+CLAUSE_END = re.compile(r"(?<=[,;:—–])\s+")
+
+
+def split_sentences(text, first_max_chars):
+    parts = [p.strip() for p in SENTENCE_END.split(text) if p and p.strip()]
+    if parts and len(parts[0]) > first_max_chars:
+        clauses = [c for c in CLAUSE_END.split(parts[0]) if c]
+        head, rest = clauses[0], clauses[1:]
+        while rest and len(head) + 1 + len(rest[0]) <= first_max_chars:
+            head = f"{head} {rest.pop(0)}"
+        parts = [head] + ([" ".join(rest)] if rest else []) + parts[1:]
+    return parts
+
+
+def wav_stream_header(channels, sampwidth, rate):
+    """WAV header with maximal sizes, for a stream whose length is unknown."""
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 0xFFFFFFFF, b"WAVE",
+        b"fmt ", 16, 1, channels, rate, rate * channels * sampwidth, channels * sampwidth, sampwidth * 8,
+        b"data", 0xFFFFFFFF - 36,
+    )
+
+
+def _read(wav_bytes):
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+        return (wf.getnchannels(), wf.getsampwidth(), wf.getframerate()), wf.readframes(wf.getnframes())
+
+
+class SpeechStreamer:
+    def __init__(self, render, workers=2, first_chunk_budget_ms=800, min_first_chars=24):
+        self.render = render
+        self.first_chunk_budget = first_chunk_budget_ms / 1000.0
+        self.min_first_chars = min_first_chars
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts-stream")
+        self._lock = threading.Lock()
+        self._seconds_per_char = None  # EWMA of rendering speed
+        self._metrics = {"streams": 0, "segments": 0, "first_chunk_seconds_max": 0.0,
+                         "first_chunk_seconds_total": 0.0, "budget_misses": 0}
+
+    def _first_max_chars(self):
+        with self._lock:
+            spc = self._seconds_per_char
+        if not spc:
+            return 80
+        return max(self.min_first_chars, int(self.first_chunk_budget / spc))
+
+    def _timed_render(self, text):
+        start = time.perf_counter()
+        wav = self.render(text)
+        elapsed = time.perf_counter() - start
+        if elapsed > 0.005:  # ignore cache hits
+            spc = elapsed / max(len(text), 1)
+            with self._lock:
+                prev = self._seconds_per_char
+                self._seconds_per_char = spc if prev is None else 0.8 * prev + 0.2 * spc
+        return wav
+
+    def stream(self, text):
+        """Yield the WAV header + PCM for each sentence, in order."""
+        start = time.perf_counter()
+        parts = split_sentences(text, self._first_max_chars())
+        futures = [self._executor.submit(self._timed_render, p) for p in parts]
+        params = None
+        try:
+            for i, future in enumerate(futures):
+                seg_params, frames = _read(future.result())
+                if params is None:
+                    params = seg_params
+                    yield wav_stream_header(*params)
+                    self._record_first_chunk(time.perf_counter() - start, len(parts))
+                elif seg_params != params:
+                    logger.warning(f"Skipping TTS segment {i}: format {seg_params} != {params}")
+                    continue
+                yield frames
+        finally:
+            for future in futures:
+                future.cancel()  # client went away; drop segments not started
+
+    def _record_first_chunk(self, seconds, segments):
+        with self._lock:
+            m = self._metrics
+            m["streams"] += 1
+            m["segments"] += segments
+            m["first_chunk_seconds_total"] += seconds
+            m["first_chunk_seconds_max"] = max(m["first_chunk_seconds_max"], seconds)
+            if seconds > self.first_chunk_budget:
+                m["budget_misses"] += 1
+
+    def stats(self):
+        with self._lock:
+            m = dict(self._metrics)
+            return {
+                "streams": m["streams"],
+                "segments": m["segments"],
+                "first_chunk_budget_ms": self.first_chunk_budget * 1000.0,
+                "first_chunk_ms_mean": 1000.0 * m["first_chunk_seconds_total"] / m["streams"] if m["streams"] else 0.0,
+                "first_chunk_ms_max": 1000.0 * m["first_chunk_seconds_max"],
+                "budget_misses": m["budget_misses"],
+                "render_ms_per_char": 1000.0 * self._seconds_per_char if self._seconds_per_char else None,
+            }